@@ -1,8 +1,22 @@
 server {
     listen ${LISTEN_PORT};
 
-    location /static {
-        alias /vol/static;
+    location /static/ {
+        root /vol;
+        # Compressed copies written by collectstatic, see reservations/storage.py.
+        # The .br ones are served by adding brotli_static on; to a build with ngx_brotli.
+        gzip_static on;
+        gzip_vary on;
+        add_header Cache-Control "public, max-age=3600";
+
+        # Names with a hash of their content never change: the collected
+        # static files and the profile picture variants.
+        location ~ "^/static/static/.+\.[0-9a-f]{12}\.\w+$" {
+            add_header Cache-Control "public, max-age=31536000, immutable";
+        }
+        location /static/media/profile_pics/variants/ {
+            add_header Cache-Control "public, max-age=31536000, immutable";
+        }
     }
 
     location / {
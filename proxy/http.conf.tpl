@@ -0,0 +1,30 @@
+server {
+    listen ${LISTEN_PORT};
+
+    location /static/ {
+        root /vol;
+        # Compressed copies written by collectstatic, see reservations/storage.py.
+        # The .br ones are served by adding brotli_static on; to a build with ngx_brotli.
+        gzip_static on;
+        gzip_vary on;
+        add_header Cache-Control "public, max-age=3600";
+
+        # Names with a hash of their content never change: the collected
+        # static files and the profile picture variants.
+        location ~ "^/static/static/.+\.[0-9a-f]{12}\.\w+$" {
+            add_header Cache-Control "public, max-age=31536000, immutable";
+        }
+        location /static/media/profile_pics/variants/ {
+            add_header Cache-Control "public, max-age=31536000, immutable";
+        }
+    }
+
+    location / {
+        proxy_pass              http://${APP_HOST}:${APP_PORT};
+        proxy_set_header        Host $host;
+        proxy_set_header        X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header        X-Forwarded-Proto $scheme;
+        client_max_body_size    10M;
+    }
+
+}
\ No newline at end of file
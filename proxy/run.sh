@@ -2,5 +2,12 @@
 
 set -e
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
+# uwsgi_pass to uWSGI, or proxy_pass to Uvicorn with APP_PROTOCOL=http
+if [ "${APP_PROTOCOL:-uwsgi}" = "http" ]; then
+    template=/etc/nginx/http.conf.tpl
+else
+    template=/etc/nginx/default.conf.tpl
+fi
+# Only the variables of the image, nginx's own $variables are kept
+envsubst '${LISTEN_PORT} ${APP_HOST} ${APP_PORT}' < "$template" > /etc/nginx/conf.d/default.conf
 nginx -g 'daemon off;'
\ No newline at end of file
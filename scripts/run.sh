@@ -5,5 +5,18 @@ set -e
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
+# Snapshots of the previous workers' metrics would be added up forever
+rm -rf "${METRICS_DIR:-/tmp/tokeneke-metrics}"
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module tokeneke.wsgi
\ No newline at end of file
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    # Uvicorn serves HTTP, so the proxy needs APP_PROTOCOL=http
+    exec uvicorn tokeneke.asgi:application --host 0.0.0.0 --port 9000 \
+        --workers "${UVICORN_WORKERS:-4}" --proxy-headers --forwarded-allow-ips '*'
+fi
+
+# Every worker keeps a connection per database for DB_CONN_MAX_AGE seconds,
+# so the database (or the pooler) must accept UWSGI_WORKERS of them per
+# container. --lazy-apps loads Django in each worker after the fork, so no
+# connection opened by the master is ever shared between workers.
+uwsgi --socket :9000 --workers "${UWSGI_WORKERS:-4}" --master --enable-threads --lazy-apps \
+    --module tokeneke.wsgi
\ No newline at end of file
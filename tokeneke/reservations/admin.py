@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Member, Venue, Event, Clinic, Participation, Date
+from .models import Member, Venue, Event, Clinic, Participation, Date, OutgoingMail
 from .forms import CreateParticipationForm ,CreateClinicForm
 
 class ClinicAdmin(admin.ModelAdmin):
@@ -10,10 +10,17 @@ class ParticipationAdmin(admin.ModelAdmin):
     form = CreateParticipationForm
 
 
+class OutgoingMailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'created_at', 'attempts', 'sent_at', 'last_error']
+    list_filter = ['sent_at']
+    exclude = ['message']
+
+
 
 admin.site.register(Member)
 admin.site.register(Venue)
 admin.site.register(Event)
 admin.site.register(Clinic, ClinicAdmin)
 admin.site.register(Date)
-admin.site.register(Participation, ParticipationAdmin)
\ No newline at end of file
+admin.site.register(Participation, ParticipationAdmin)
+admin.site.register(OutgoingMail, OutgoingMailAdmin)
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Async versions of the read views, which urls.py routes to when the app runs
+under ASGI (SERVER_MODE=asgi). Their queries go through the async ORM, so a
+slow one doesn't hold a worker. The cards, which prefetch and render
+templates, still run in a thread.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import redirect, render
+
+from .cards import add_cards
+from .feeds import aget_calendar_dates
+from .models import Event
+from .routers import read_from_replica
+from .views import check_calendar_window, get_available_events, parse_calendar_bound
+
+
+def login_required(view):
+    """
+    login_required for async views. Loading request.user reads the session
+    and the member synchronously, so it runs in a thread.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@login_required
+@read_from_replica
+async def filter_events(request):
+    if request.method != "POST":
+        return HttpResponseBadRequest("Not a post")
+    string = request.POST.get('input')
+    curr_events = json.loads(request.POST.get('curr_events'))
+    titles = Event.objects.filter(title__in=curr_events).filter(
+        title__icontains=string).values_list('title', flat=True)
+    return JsonResponse({'data': [title async for title in titles]})
+
+
+@login_required
+@read_from_replica
+async def home(request):
+    events = [event async for event in get_available_events(request).with_next_date()]
+    events = await sync_to_async(add_cards)(events, request.user)
+    schedule = await request.user.aget_schedule()
+    return render(request, 'main/home.html', {
+        'events': events,
+        'page_title': 'Events Available',
+        'titles': {
+            'Registered Dates': len(schedule),
+            'Registered Events': len(request.user.get_schedule_events()),
+            'Events Available': len(events)
+        }
+    })
+
+
+@login_required
+@read_from_replica
+async def event(request, event_id):
+    event = await Event.objects.aget(id=event_id)
+    dates = await event.aget_date_details(request.user, 20)
+    if dates:
+        return render(request, 'main/event.html', {'event': event, 'dates': dates})
+    else:
+        return redirect("home")
+
+
+@login_required
+@read_from_replica
+async def calendar_feed(request):
+    # Returns the dates of the window between the start and end parameters
+    start = parse_calendar_bound(request.GET.get('start'))
+    end = parse_calendar_bound(request.GET.get('end'))
+    error = check_calendar_window(start, end)
+    if error:
+        return HttpResponseBadRequest(error)
+    return JsonResponse({'dates': await aget_calendar_dates(request.user, start, end)})
@@ -0,0 +1,26 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+# Seconds a Member is served from the cache
+MEMBER_CACHE_TIMEOUT = 60 * 15
+
+
+def get_member_cache_key(user_id):
+    return f'member:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that loads the logged in Member from the shared cache, so
+    AuthenticationMiddleware doesn't query it on every request. The cached
+    Member is removed whenever it is saved or deleted, see signals.py.
+    """
+
+    def get_user(self, user_id):
+        key = get_member_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, MEMBER_CACHE_TIMEOUT)
+        return user
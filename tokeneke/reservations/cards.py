@@ -0,0 +1,108 @@
+"""
+Cached event cards of main/home.html.
+
+Every Event and Date has a version counter in the shared cache. signals.py
+bumps the event's on changes to the event and its clinics, and the date's on
+changes to the date and its participations. A card is cached under the
+versions of the event and of its next date, so it is rendered again only
+after one of them changes or once the next date has passed.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .routers import get_read_database
+
+# Seconds a rendered card is kept, it is only read again on the same day
+CARD_TIMEOUT = 60 * 60 * 24
+# Seconds a card rendered from a replica is kept, since the replica may not
+# have the change that bumped the versions yet
+REPLICA_CARD_TIMEOUT = 30
+
+
+def get_event_version_key(event_id):
+    return f'event_version:{event_id}'
+
+
+def get_date_version_key(date_id):
+    return f'date_version:{date_id}'
+
+
+def get_versions(keys):
+    # Returns {key: version} of the version keys, starting the missing ones
+    versions = cache.get_many(keys)
+    # A version lost by the cache starts from a new value, so the cards of
+    # the old one are never read again.
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def bump_versions(keys):
+    """
+    Bumps the version keys, so the cards that depend on them are rendered
+    again. It bumps them again once the transaction commits, in case a card
+    was rendered with the data from before the commit meanwhile.
+    """
+    keys = set(keys)
+
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # No version yet, so there is no card to invalidate
+                pass
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def bump_event_versions(event_ids):
+    bump_versions(get_event_version_key(event_id) for event_id in event_ids)
+
+
+def bump_date_versions(date_ids):
+    bump_versions(get_date_version_key(date_id) for date_id in date_ids)
+
+
+def add_cards(events, user):
+    """
+    Sets the card_html of the Events, which come from
+    EventQuerySet.with_next_date(), from the cache. The next dates and
+    participants of the cards that aren't cached are prefetched together
+    and their cards rendered and cached. Returns the list of events.
+    """
+    from .models import EventQuerySet
+
+    events = list(events)
+    version_keys = {event.id: (get_event_version_key(event.id), get_date_version_key(event.next_date_id))
+                    for event in events}
+    versions = get_versions([key for keys in version_keys.values() for key in keys])
+    today = timezone.localdate()
+    keys = {}
+    for event in events:
+        event_version, date_version = (versions[key] for key in version_keys[event.id])
+        keys[event.id] = (f'event_card:{event.id}:{event_version}:{event.next_date_id}:{date_version}:'
+                          f'{int(user.is_staff)}:{today}')
+    cards = cache.get_many(keys.values())
+
+    missing = [event for event in events if keys[event.id] not in cards]
+    if missing:
+        prefetch_related_objects(missing, EventQuerySet.get_summary_prefetch(
+            [event.next_date_id for event in missing]))
+        rendered = {keys[event.id]: render_to_string(
+            'main/event_card.html', {'event': event, 'user': user}) for event in missing}
+        cache.set_many(rendered, REPLICA_CARD_TIMEOUT if get_read_database() else CARD_TIMEOUT)
+        cards.update(rendered)
+
+    for event in events:
+        event.card_html = mark_safe(cards[keys[event.id]])
+    return events
@@ -1,5 +1,16 @@
 from datetime import datetime, timedelta
 
-date_limit = datetime.now() + timedelta(days=182)
+# How many days ahead the Date instances of the clinics are created
+DATES_HORIZON_DAYS = 182
+# Registrations of a Date can't be changed once it's this close to start
+REGISTRATION_CLOSES_BEFORE = timedelta(hours=24)
 
-date_limit_deletion = date_limit + timedelta(days=40)
\ No newline at end of file
+
+def get_date_limit():
+    # Computed on every call, so long running workers don't keep the
+    # horizon of the moment they started.
+    return datetime.now() + timedelta(days=DATES_HORIZON_DAYS)
+
+
+def get_date_limit_deletion():
+    return get_date_limit() + timedelta(days=40)
@@ -0,0 +1,168 @@
+"""
+iCalendar feeds of the members' registrations and of the events' dates, and
+the JSON feed of the calendar page.
+
+The member feeds are addressed by a signed token, since calendar apps can't
+log in. Every member has the time of the last change to their schedule in
+the shared cache, which the feeds send as Last-Modified and ETag, so the
+apps polling them get a 304 without a query.
+"""
+import hashlib
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+
+FEED_SALT = 'reservations.feeds'
+# Days of past dates kept in the feeds
+FEED_PAST_DAYS = 30
+FEED_PRODID = '-//Tokeneke//Reservations//EN'
+# Longest window of the calendar feed, a month and a bit
+CALENDAR_MAX_DAYS = 42
+# Seconds a window of the calendar feed is cached. Other members'
+# registrations show up after it, the member's own ones right away.
+CALENDAR_TIMEOUT = 60
+
+
+def get_member_feed_token(member):
+    return signing.Signer(salt=FEED_SALT).sign(str(member.id))
+
+
+def get_feed_member_id(token):
+    # Returns the id of the member of the feed token, or None if it isn't valid
+    try:
+        return int(signing.Signer(salt=FEED_SALT).unsign(token))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def get_schedule_key(member_id):
+    return f'schedule_updated:{member_id}'
+
+
+def touch_schedules(member_ids):
+    # Records that the schedules of the members changed now
+    now = timezone.now()
+    cache.set_many({get_schedule_key(member_id): now for member_id in set(member_ids)}, None)
+
+
+def get_schedule_updated(member_id):
+    """
+    Returns the time the member's schedule last changed. When the cache lost
+    it, the schedule counts as changed now, so the feed is sent again.
+    """
+    key = get_schedule_key(member_id)
+    updated = cache.get(key)
+    if updated is None:
+        updated = timezone.now()
+        # Another process may have just recorded a change
+        if not cache.add(key, updated, None):
+            updated = cache.get(key, updated)
+    return updated
+
+
+def get_event_feed_etag(event):
+    # Returns a hash of everything the event's feed shows, one slim query
+    dates = event.get_feed_dates().values_list('id', 'datetime_start', 'datetime_end', 'clinic__title')
+    return hashlib.sha1(repr((event.title, list(dates))).encode()).hexdigest()
+
+
+def escape(text):
+    # Escapes a TEXT value of RFC 5545
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    # Splits the line in lines of 75 octets at most, the next ones start with a space
+    encoded = line.encode()
+    lines = []
+    while len(encoded) > 75:
+        cut = 75 if not lines else 74
+        # Doesn't split a multibyte character
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        lines.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    lines.append(encoded.decode())
+    return '\r\n '.join(lines) + '\r\n'
+
+
+def format_datetime(value):
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def iter_calendar(name, dates):
+    """
+    Yields the lines of an iCalendar with a VEVENT per (date, summary) pair
+    of dates, which can be an iterator over a query.
+    """
+    now = format_datetime(timezone.now())
+    yield fold('BEGIN:VCALENDAR')
+    yield fold('VERSION:2.0')
+    yield fold(f'PRODID:{FEED_PRODID}')
+    yield fold('CALSCALE:GREGORIAN')
+    yield fold(f'X-WR-CALNAME:{escape(name)}')
+    for date, summary in dates:
+        yield fold('BEGIN:VEVENT')
+        yield fold(f'UID:date-{date.id}@tokeneke')
+        yield fold(f'DTSTAMP:{now}')
+        yield fold(f'DTSTART:{format_datetime(date.datetime_start)}')
+        yield fold(f'DTEND:{format_datetime(date.datetime_end)}')
+        yield fold(f'SUMMARY:{escape(summary)}')
+        yield fold('END:VEVENT')
+    yield fold('END:VCALENDAR')
+
+
+def get_feed_start():
+    return timezone.now() - timedelta(days=FEED_PAST_DAYS)
+
+
+def get_calendar_key(member, start, end):
+    # The key holds the time the member's schedule last changed, so their
+    # registrations show at once.
+    return 'calendar:' + hashlib.sha1(
+        f'{member.id}|{start.isoformat()}|{end.isoformat()}|'
+        f'{get_schedule_updated(member.id).isoformat()}'.encode()).hexdigest()
+
+
+def format_calendar_date(date):
+    # Returns the dict of the calendar page of a row of DateQuerySet.for_calendar()
+    return {
+        'id': date['id'],
+        'start': date['datetime_start'].isoformat(),
+        'end': date['datetime_end'].isoformat(),
+        'title': date['title'],
+        'event_id': date['event_id'],
+        'rem_spots': date['rem_spots'],
+        'registered': date['registered'],
+    }
+
+
+def get_calendar_dates(member, start, end):
+    """
+    Returns a list with a dict per Date starting in [start, end) for the
+    calendar page, cached per member and window.
+    """
+    from .models import Date
+
+    key = get_calendar_key(member, start, end)
+    dates = cache.get(key)
+    if dates is None:
+        dates = [format_calendar_date(date) for date in Date.objects.for_calendar(member, start, end)]
+        cache.set(key, dates, CALENDAR_TIMEOUT)
+    return dates
+
+
+async def aget_calendar_dates(member, start, end):
+    # get_calendar_dates() for the async views
+    from .models import Date
+
+    key = await sync_to_async(get_calendar_key)(member, start, end)
+    dates = await cache.aget(key)
+    if dates is None:
+        dates = [format_calendar_date(date) async for date in Date.objects.for_calendar(member, start, end)]
+        await cache.aset(key, dates, CALENDAR_TIMEOUT)
+    return dates
@@ -36,9 +36,8 @@ class CreateParticipationForm(forms.ModelForm):
         cleaned_data = super().clean()
         member = cleaned_data.get('member')
         date = cleaned_data.get('date')
-        event = date.get_event()
-        if event.gender != 'MIXED' and event.gender != member.gender:
-            raise ValidationError(f"{str(member)} can't participate in a event for {event.get_gender_display().lower()}s.")
+        if member and date and not date.is_eligible(member):
+            raise ValidationError(f"{str(member)} can't participate in a event for {date.get_eligible_gender_display().lower()}s.")
         return cleaned_data
 
 class MemberAuthForm(AuthenticationForm):
@@ -59,6 +58,23 @@ class CreateDateForm(forms.ModelForm):
             'participants': forms.CheckboxSelectMultiple(),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The clinic choices are printed with their event and next date
+        self.fields['clinic'].queryset = Clinic.objects.with_next_date()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        clinic = cleaned_data.get('clinic')
+        if not clinic:
+            return cleaned_data
+        # The rule of the clinic picked in the form, the Date may be moved to another one
+        event = clinic.event
+        for member in cleaned_data.get('participants') or []:
+            if not event.is_eligible(member):
+                raise ValidationError(f"{str(member)} can't participate in a event for {event.get_gender_display().lower()}s.")
+        return cleaned_data
+
 class CreateEventForm(forms.ModelForm):
     class Meta:
         model = Event
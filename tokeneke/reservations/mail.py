@@ -0,0 +1,122 @@
+"""
+Outbox of the mails. EMAIL_BACKEND is OutboxEmailBackend, so sending a mail
+from a request only inserts an OutgoingMail. The deliver_mail command sends
+them in batches over one connection of OUTBOX_EMAIL_BACKEND, any Django
+email backend, and retries the failed ones later and later.
+"""
+import smtplib
+from datetime import timedelta
+from email import message_from_bytes
+from email.message import Message
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import sanitize_address
+from django.db import transaction
+from django.utils import timezone
+
+# Attempts after which a mail is given up on, with its last error kept
+MAIL_MAX_ATTEMPTS = 8
+# Seconds before the first retry, doubled after every failure
+MAIL_RETRY_DELAY = 60
+MAIL_MAX_RETRY_DELAY = 60 * 60 * 6
+# Seconds a mail is leased for when EMAIL_TIMEOUT isn't set
+MAIL_SEND_TIMEOUT = 60
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        # Inserts the messages in the outbox with one query
+        from .models import OutgoingMail
+
+        mails = []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            encoding = message.encoding or 'utf-8'
+            mails.append(OutgoingMail(
+                subject=message.subject[:255],
+                from_email=sanitize_address(message.from_email, encoding),
+                recipients=[sanitize_address(addr, encoding) for addr in message.recipients()],
+                message=message.message().as_bytes(linesep='\r\n')))
+        OutgoingMail.objects.bulk_create(mails)
+        return len(mails)
+
+
+class StoredMIMEMessage(Message):
+    # Takes the linesep of the backends, like Django's SafeMIME classes
+    def as_bytes(self, unixfrom=False, linesep='\n'):
+        return super().as_bytes(unixfrom, policy=self.policy.clone(linesep=linesep))
+
+
+class StoredEmailMessage(EmailMessage):
+    """An OutgoingMail, sent through an email backend as it was stored"""
+
+    def __init__(self, mail):
+        super().__init__(mail.subject, from_email=mail.from_email, to=mail.recipients)
+        self.stored_message = bytes(mail.message)
+
+    def message(self):
+        return message_from_bytes(self.stored_message, _class=StoredMIMEMessage)
+
+
+def get_retry_delay(attempts):
+    return timedelta(seconds=min(MAIL_RETRY_DELAY * 2 ** (attempts - 1), MAIL_MAX_RETRY_DELAY))
+
+
+def get_lease(count):
+    # The mails are sent one after the other, and each can take up to the timeout
+    return timedelta(seconds=count * (settings.EMAIL_TIMEOUT or MAIL_SEND_TIMEOUT))
+
+
+def claim_due_mail(batch_size):
+    """
+    Returns up to batch_size due mails, counted as attempted and due again
+    once the whole batch could have been sent, and not before the retry
+    delay. That is a lease, so the other workers skip them while they are
+    sent, and they are retried if this worker dies.
+    """
+    from .models import OutgoingMail
+
+    with transaction.atomic():
+        mails = list(OutgoingMail.objects.due().select_for_update(skip_locked=True).order_by(
+            'next_attempt_at', 'id')[:batch_size])
+        lease = get_lease(len(mails))
+        for mail in mails:
+            mail.attempts += 1
+            mail.next_attempt_at = timezone.now() + max(get_retry_delay(mail.attempts), lease)
+        OutgoingMail.objects.bulk_update(mails, ['attempts', 'next_attempt_at'])
+    return mails
+
+
+def deliver_due_mail(connection, batch_size):
+    """
+    Sends up to batch_size due mails over the connection, an email backend
+    that is opened when needed and left open, and returns the mails. The
+    mails are claimed in a short transaction and sent outside of it, and
+    the failed ones are due again after the retry delay.
+    """
+    from .models import OutgoingMail
+
+    mails = claim_due_mail(batch_size)
+    for mail in mails:
+        try:
+            connection.open()
+            sent = connection.send_messages([StoredEmailMessage(mail)])
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as err:
+            # The server refused the mail, the connection can be used for the next ones
+            mail.last_error = repr(err)
+        except Exception as err:
+            connection.close()
+            mail.last_error = repr(err)
+        else:
+            if sent:
+                mail.sent_at = timezone.now()
+                mail.last_error = ''
+            else:
+                mail.last_error = 'The email backend sent nothing'
+        if not mail.sent_at:
+            mail.next_attempt_at = timezone.now() + get_retry_delay(mail.attempts)
+    OutgoingMail.objects.bulk_update(mails, ['sent_at', 'last_error', 'next_attempt_at'])
+    return mails
@@ -0,0 +1,85 @@
+"""
+Django command to create the resized variants of the profile pictures
+uploaded before they were made at upload time. Pictures shared by several
+members, like the default one, are only processed once.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+from PIL import Image
+
+from reservations.backends import get_member_cache_key
+from reservations.cards import bump_date_versions
+from reservations.models import Date, Member
+from reservations.profile_pics import save_variants
+
+
+def process_picture(name):
+    # Runs in the worker processes, it doesn't touch the database. Returns
+    # the hash of the variants, or None if the picture can't be read.
+    try:
+        with default_storage.open(name) as picture:
+            return save_variants(picture)
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+
+class Command(BaseCommand):
+    """Django command to create the variants of the existing profile pictures."""
+
+    help = "Creates the resized variants of the profile pictures that don't have them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help="Number of pictures processed at a time.")
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="Number of processes the pictures are resized with.")
+
+    def record_hash(self, name, pic_hash):
+        # Updates the members of the picture without signals, so their
+        # cached copies and cards are invalidated here.
+        member_ids = list(Member.objects.filter(
+            profile_pic=name, profile_pic_hash='').values_list('id', flat=True))
+        Member.objects.filter(id__in=member_ids).update(profile_pic_hash=pic_hash)
+        cache.delete_many([get_member_cache_key(member_id) for member_id in member_ids])
+        bump_date_versions(Date.objects.filter(
+            participation__member__in=member_ids).values_list('id', flat=True).distinct())
+        return len(member_ids)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        started = time.monotonic()
+        names = list(Member.objects.filter(profile_pic_hash='').exclude(profile_pic='').order_by(
+            'profile_pic').values_list('profile_pic', flat=True).distinct())
+
+        pool = None
+        if options['workers'] > 1:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=options['workers'])
+
+        members = failed = 0
+        try:
+            for i in range(0, len(names), options['batch_size']):
+                batch = names[i:i + options['batch_size']]
+                hashes = pool.map(process_picture, batch) if pool else map(process_picture, batch)
+                for name, pic_hash in zip(batch, hashes):
+                    if pic_hash is None:
+                        self.stderr.write(f"Couldn't read {name}")
+                        failed += 1
+                    else:
+                        members += self.record_hash(name, pic_hash)
+                self.stdout.write(f'Processed {i + len(batch)} of {len(names)} pictures...')
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created the variants of {len(names) - failed} pictures of {members} members '
+            f'in {time.monotonic() - started:.2f}s, {failed} pictures failed.'))
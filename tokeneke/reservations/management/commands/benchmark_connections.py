@@ -0,0 +1,76 @@
+"""
+Django command to measure the overhead of opening a database connection per
+request. It runs the same requests twice: closing the connection after each
+one, like CONN_MAX_AGE = 0, and keeping it with health checks, like the
+settings do.
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from reservations.models import Member
+from .benchmark_views import percentile
+
+
+class Command(BaseCommand):
+    """Django command to compare new and persistent database connections."""
+
+    help = "Records the latency of requests with a new and with a persistent database connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--output', help="File the JSON results are written to.")
+
+    def run_requests(self, iterations, conn_max_age):
+        """
+        Returns {'p50_ms': ..., 'p95_ms': ..., 'connections': ...} of requests
+        that run a query, between the signals Django sends around requests,
+        which close the connections that are too old or broken.
+        """
+        settings_dict = connection.settings_dict
+        previous = settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS']
+        settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS'] = conn_max_age, conn_max_age != 0
+        connection.close()
+        latencies = []
+        connections = []
+
+        def count_connection(sender, connection, **kwargs):
+            connections.append(connection.alias)
+
+        connection_created.connect(count_connection)
+        try:
+            for i in range(iterations):
+                started = time.perf_counter()
+                request_started.send(sender=self.__class__)
+                Member.objects.filter(id=0).exists()
+                request_finished.send(sender=self.__class__)
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection_created.disconnect(count_connection)
+            connection.close()
+            settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS'] = previous
+        return {
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'connections': len(connections),
+        }
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        results = {
+            'new': self.run_requests(options['iterations'], 0),
+            'persistent': self.run_requests(options['iterations'], None),
+        }
+        for name, result in results.items():
+            self.stdout.write(f"{name:<12} {result}")
+        overhead = results['new']['p50_ms'] - results['persistent']['p50_ms']
+        self.stdout.write(f"Opening a connection adds {overhead:.3f}ms to the median request")
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,131 @@
+"""
+Django command to benchmark the main pages through the test client. It is
+meant to be run against a database filled with seed_club, and writes JSON
+results that can be compared between releases with --compare.
+"""
+import json
+import platform
+import time
+from contextlib import ExitStack
+
+import django
+import recurrence
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from reservations.models import Clinic, Event, Member
+from reservations.routers import PRIMARY_DATABASE
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile
+    values = sorted(values)
+    return values[max(0, int(round(pct / 100 * len(values))) - 1)]
+
+
+class Command(BaseCommand):
+    """Django command to record the latency and SQL queries of the main pages."""
+
+    help = "Records p50/p95 latency and SQL query counts of the main pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--output', default='benchmark.json',
+                            help="File the JSON results are written to.")
+        parser.add_argument('--compare',
+                            help="JSON results of a previous run to compare with.")
+
+    def get_scenarios(self):
+        # Returns a list of (name, member, method, url, data) for each page
+        member = Member.objects.filter(is_staff=False).annotate(
+            parts=Count('participation')).order_by('-parts').first()
+        staff = Member.objects.filter(is_staff=True).first()
+        event = Event.objects.filter(clinic__date__datetime_start__gte=timezone.now(),
+                                     gender__in=[Event.EVENT_MIXED, getattr(member, 'gender', None)]).first()
+        clinic = Clinic.objects.filter(event=event).first()
+        if not (member and staff and event):
+            raise CommandError("The database needs a staff member, members and events with "
+                               "future dates, run seed_club and createsuperuser first.")
+
+        date_ids = [date.id for date in event.get_fut_dates(4) if date.is_registrable()]
+        clinic_data = {
+            'title': clinic.title, 'recurrences': recurrence.serialize(clinic.recurrences),
+            'start_time': clinic.start_time,
+            'end_time': clinic.end_time, 'capacity': clinic.capacity, 'event': event.id,
+            'is_active': clinic.is_active,
+        }
+        return [
+            ('home', member, 'get', reverse('home'), None),
+            ('my_events', member, 'get', reverse('my_events'), None),
+            ('event', member, 'get', reverse('event', args=[event.id]), None),
+            ('event_participants', member, 'get', reverse('event_participants', args=[event.id]), None),
+            # Alternates between registering and unregistering
+            ('add_participant', member, 'post', reverse('add_participant'),
+             [{'event_id': event.id, 'dates': json.dumps(date_ids)},
+              {'event_id': event.id, 'dates': json.dumps([])}]),
+            ('edit_clinic', staff, 'get', reverse('edit_clinic', args=[clinic.id]), None),
+            ('edit_clinic_save', staff, 'post', reverse('edit_clinic', args=[clinic.id]), [clinic_data]),
+        ]
+
+    def run_scenario(self, client, method, url, data, iterations):
+        latencies = []
+        queries = []
+        for i in range(iterations):
+            kwargs = {'data': data[i % len(data)]} if data else {}
+            # The reads may go to the replicas, so the queries of every database are counted
+            with ExitStack() as stack:
+                contexts = [stack.enter_context(CaptureQueriesContext(connections[alias]))
+                            for alias in [PRIMARY_DATABASE, *settings.REPLICA_DATABASES]]
+                started = time.perf_counter()
+                response = getattr(client, method)(url, **kwargs)
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f"{method.upper()} {url} returned {response.status_code}")
+            queries.append(sum(len(ctx) for ctx in contexts))
+        return {
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'queries': percentile(queries, 50),
+        }
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        results = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'iterations': options['iterations'],
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'members': Member.objects.count(),
+                'events': Event.objects.count(),
+            },
+            'views': {},
+        }
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, member, method, url, data in self.get_scenarios():
+                client = Client()
+                client.force_login(member)
+                # Warm up the caches and the connection before measuring
+                self.run_scenario(client, method, url, data, 1)
+                results['views'][name] = self.run_scenario(
+                    client, method, url, data, options['iterations'])
+                self.stdout.write(f"{name:<20} {results['views'][name]}")
+
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as previous_file:
+                previous = json.load(previous_file)['views']
+            for name, current in results['views'].items():
+                if name in previous:
+                    deltas = ', '.join(f'{key} {previous[name][key]} -> {value}'
+                                       for key, value in current.items())
+                    self.stdout.write(f'{name:<20} {deltas}')
@@ -0,0 +1,32 @@
+"""
+Django command to write the JavaScript translation catalog of the recurrence
+widget to a static file, so it is built once with the image instead of by
+JavaScriptCatalog on every request.
+"""
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import translation
+from django.views.i18n import JavaScriptCatalog
+
+JSI18N_PACKAGES = ['recurrence']
+JSI18N_NAME = 'jsi18n.js'
+
+
+class Command(BaseCommand):
+    """Django command to build the JavaScript translation catalog."""
+
+    help = "Writes the JavaScript translation catalog to GENERATED_STATIC_DIR."
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with translation.override(settings.LANGUAGE_CODE):
+            response = JavaScriptCatalog.as_view(packages=JSI18N_PACKAGES)(
+                RequestFactory().get(f'/{JSI18N_NAME}'))
+        os.makedirs(settings.GENERATED_STATIC_DIR, exist_ok=True)
+        path = os.path.join(settings.GENERATED_STATIC_DIR, JSI18N_NAME)
+        with open(path, 'wb') as catalog:
+            catalog.write(response.content)
+        self.stdout.write(self.style.SUCCESS(f'JavaScript catalog written to {path}'))
@@ -0,0 +1,52 @@
+"""
+Django command to send the mails of the outbox. It runs as its own service,
+next to the web workers, and sends the due mails in batches over one
+connection of OUTBOX_EMAIL_BACKEND, which it keeps open while there are
+mails to send.
+"""
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from reservations.mail import deliver_due_mail
+
+
+class Command(BaseCommand):
+    """Django command to deliver the mails of the outbox."""
+
+    help = "Sends the due mails of the outbox, retrying the failed ones with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help="Number of mails claimed at a time.")
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help="Seconds between looks at the outbox when it is empty.")
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Sends the mails that are due and exits.")
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        connection = get_connection(settings.OUTBOX_EMAIL_BACKEND)
+        sent = failed = 0
+        try:
+            while True:
+                mails = deliver_due_mail(connection, options['batch_size'])
+                batch_sent = sum(1 for mail in mails if mail.sent_at)
+                sent += batch_sent
+                failed += len(mails) - batch_sent
+                if mails:
+                    self.stdout.write(f'Sent {batch_sent} of {len(mails)} mails.')
+                    continue
+                # The server would drop the connection while the outbox is empty
+                connection.close()
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            connection.close()
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} mails, {failed} attempts failed.'))
@@ -0,0 +1,97 @@
+"""
+Django command to create the Date instances of the active clinics up to the
+current horizon. It is meant to be run from cron, so the dates keep rolling
+forward even if nobody edits the clinics.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Max
+
+from reservations.constants import get_date_limit
+from reservations.models import Clinic, Date
+
+
+def expand_occurrences(clinic, limit, until):
+    # Runs in the worker processes, it doesn't touch the database.
+    return clinic.get_occurrence_datetimes(limit, until)
+
+
+class Command(BaseCommand):
+    """Django command to extend the dates of the active clinics."""
+
+    help = "Creates the Date instances of the active clinics up to the current horizon."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help="Number of clinics loaded and written at a time.")
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="Number of processes the recurrences are expanded with.")
+        parser.add_argument(
+            '--limit', type=int,
+            help="Maximum number of future dates per clinic, none by default so the "
+                 "dates go up to the horizon.")
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        started = time.monotonic()
+        batch_size = options['batch_size']
+        limit = options['limit']
+        # Computed once per run, so every clinic gets the same horizon
+        until = get_date_limit()
+
+        pool = None
+        if options['workers'] > 1:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=options['workers'])
+
+        clinics_count = created = 0
+        expand_time = write_time = 0
+        last_id = 0
+        try:
+            while True:
+                clinics = list(Clinic.objects.select_related('event').filter(
+                    is_active=True, id__gt=last_id).order_by('id')[:batch_size])
+                if not clinics:
+                    break
+                last_id = clinics[-1].id
+
+                expand_started = time.monotonic()
+                if pool:
+                    occurrences = list(pool.map(
+                        expand_occurrences, clinics, [limit] * len(clinics), [until] * len(clinics)))
+                else:
+                    occurrences = [expand_occurrences(clinic, limit, until) for clinic in clinics]
+                expand_time += time.monotonic() - expand_started
+
+                write_started = time.monotonic()
+                # Only the occurrences after each clinic's last date are created, so the
+                # dates moved or deleted by the staff are left as they are.
+                last_starts = dict(Date.objects.filter(clinic__in=clinics).values(
+                    'clinic').annotate(last=Max('datetime_start')).values_list('clinic', 'last'))
+                new_dates = []
+                for clinic, clinic_occurrences in zip(clinics, occurrences):
+                    new_dates += clinic.get_new_dates(
+                        clinic_occurrences, last_starts.get(clinic.id))
+                with transaction.atomic():
+                    # A concurrent run or clinic edit may have created some of them already
+                    Date.objects.bulk_create(new_dates, batch_size=1000, ignore_conflicts=True)
+                write_time += time.monotonic() - write_started
+
+                clinics_count += len(clinics)
+                created += len(new_dates)
+                self.stdout.write(
+                    f'Processed {clinics_count} clinics, {created} dates created so far...')
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Materialized the dates of {clinics_count} clinics until {until:%Y-%m-%d}: '
+            f'{created} dates created in {time.monotonic() - started:.2f}s '
+            f'(expansion {expand_time:.2f}s, writes {write_time:.2f}s).'))
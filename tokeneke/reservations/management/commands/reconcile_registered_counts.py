@@ -0,0 +1,18 @@
+"""
+Django command to fix the registered count of the dates.
+"""
+from django.core.management.base import BaseCommand
+
+from reservations.models import Date
+
+
+class Command(BaseCommand):
+    """Django command to recount the participations of every date."""
+
+    help = "Recounts the participations of every date and fixes the registered counts that drifted."
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        fixed = Date.objects.all().reconcile_registered_count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed the registered count of {fixed} dates.'))
@@ -0,0 +1,31 @@
+"""
+Django command to fill the database with a synthetic club.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reservations.seed import SEED_PASSWORD, seed_club
+
+
+class Command(BaseCommand):
+    """Django command to generate members, events, clinics, dates and participations."""
+
+    help = "Generates a synthetic club with a deterministic seed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=200)
+        parser.add_argument('--events', type=int, default=40)
+        parser.add_argument('--clinics-per-event', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        started = time.monotonic()
+        with transaction.atomic():
+            created = seed_club(options['members'], options['events'],
+                                options['clinics_per_event'], options['seed'])
+        self.stdout.write(self.style.SUCCESS(
+            'Created ' + ', '.join(f'{count} {name}' for name, count in created.items()) +
+            f' in {time.monotonic() - started:.2f}s. The members log in with the password "{SEED_PASSWORD}".'))
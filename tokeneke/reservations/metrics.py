@@ -0,0 +1,112 @@
+"""
+Per view request metrics: wall time, SQL query count, SQL time and duplicate
+queries, kept as histograms.
+
+Every process keeps its own histograms and regularly writes them to a file
+in settings.METRICS_DIR, so the metrics endpoint can add up the ones of all
+the uWSGI workers.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERIES_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+HISTOGRAMS = {
+    'tokeneke_request_duration_seconds': ("Wall time of the requests.", DURATION_BUCKETS),
+    'tokeneke_request_sql_queries': ("SQL queries run by the requests.", QUERIES_BUCKETS),
+    'tokeneke_request_sql_duration_seconds': ("Time spent in SQL by the requests.", DURATION_BUCKETS),
+    'tokeneke_request_sql_duplicate_queries': ("Repeated SQL queries run by the requests.", QUERIES_BUCKETS),
+}
+
+_lock = threading.Lock()
+# {metric name: {view name: {'buckets': [...], 'sum': float, 'count': int}}}
+_histograms = {name: {} for name in HISTOGRAMS}
+_last_flush = 0
+
+
+def observe(view, duration, queries, sql_duration, duplicates):
+    """
+    Records a request of the view in the histograms of this process and
+    writes them to the metrics directory if they weren't written recently.
+    """
+    values = {
+        'tokeneke_request_duration_seconds': duration,
+        'tokeneke_request_sql_queries': queries,
+        'tokeneke_request_sql_duration_seconds': sql_duration,
+        'tokeneke_request_sql_duplicate_queries': duplicates,
+    }
+    with _lock:
+        for name, value in values.items():
+            buckets = HISTOGRAMS[name][1]
+            histogram = _histograms[name].setdefault(
+                view, {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0})
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+    if time.monotonic() - _last_flush > settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def flush():
+    # Writes the histograms of this process to its file in the metrics directory
+    global _last_flush
+    with _lock:
+        snapshot = json.dumps(_histograms)
+        _last_flush = time.monotonic()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    # Written to a temporary file first, so readers never see half a file
+    fd, path = tempfile.mkstemp(dir=settings.METRICS_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as snapshot_file:
+        snapshot_file.write(snapshot)
+    os.replace(path, os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json'))
+
+
+def collect():
+    """
+    Returns the histograms of all the processes added up, with the same
+    structure as the ones kept by each process.
+    """
+    flush()
+    merged = {name: {} for name in HISTOGRAMS}
+    for filename in os.listdir(settings.METRICS_DIR):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, filename)) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError):
+            continue
+        for name, views in snapshot.items():
+            if name not in merged:
+                continue
+            for view, histogram in views.items():
+                total = merged[name].setdefault(
+                    view, {'buckets': [0] * len(histogram['buckets']), 'sum': 0, 'count': 0})
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+                total['sum'] += histogram['sum']
+                total['count'] += histogram['count']
+    return merged
+
+
+def render_prometheus(histograms):
+    # Returns the histograms in the Prometheus text exposition format
+    lines = []
+    for name, views in histograms.items():
+        description, buckets = HISTOGRAMS[name]
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for view, histogram in sorted(views.items()):
+            for bound, count in zip(buckets, histogram['buckets']):
+                lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{name}_sum{{view="{view}"}} {round(histogram["sum"], 6)}')
+            lines.append(f'{name}_count{{view="{view}"}} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
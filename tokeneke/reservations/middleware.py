@@ -0,0 +1,108 @@
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# QueryRecorder of the request being handled. A context variable, since the
+# async views run their queries in other threads, which copy the context.
+_recorder = ContextVar('query_recorder', default=None)
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that times every query, so it works with
+    DEBUG off, when connection.queries stays empty.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - started, sql, repr(params)))
+
+    def get_duplicates(self):
+        # Number of queries that repeat an earlier one with the same parameters
+        return len(self.queries) - len({(sql, params) for _, sql, params in self.queries})
+
+
+def record_query(execute, sql, params, many, context):
+    # Execute wrapper of every connection, which hands the query to the recorder of the request
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def add_query_recorder(connection):
+    # Called when the connection is created, in whatever thread it belongs to
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the wall time, SQL queries, SQL time and duplicate queries of
+    every request in the metrics of its view, and logs a sample of the slow
+    requests with their slowest queries. It is async capable, so the async
+    views don't hold a thread for the whole request in ASGI mode.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.observe(request, recorder, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        # The metrics are written to files now and then, out of the event loop
+        await sync_to_async(self.observe, thread_sensitive=False)(
+            request, recorder, time.perf_counter() - started)
+        return response
+
+    def observe(self, request, recorder, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        sql_duration = sum(query_duration for query_duration, _, _ in recorder.queries)
+        metrics.observe(view, duration, len(recorder.queries), sql_duration,
+                        recorder.get_duplicates())
+
+        if duration * 1000 >= settings.METRICS_SLOW_REQUEST_MS and \
+                random.random() < settings.METRICS_SLOW_REQUEST_SAMPLE_RATE:
+            worst = sorted(recorder.queries, key=lambda query: query[0], reverse=True)[:3]
+            logger.warning(
+                "Slow request %s %s (%s): %.0fms, %d queries in %.0fms, %d duplicates. Slowest queries:\n%s",
+                request.method, request.path, view, duration * 1000, len(recorder.queries),
+                sql_duration * 1000, recorder.get_duplicates(),
+                '\n'.join(f'{query_duration * 1000:.1f}ms {sql[:500]}' for query_duration, sql, _ in worst))
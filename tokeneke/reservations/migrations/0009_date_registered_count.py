@@ -0,0 +1,29 @@
+# Generated by Django 4.1.13 on 2026-10-18 15:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_registrations(apps, schema_editor):
+    Date = apps.get_model('reservations', 'Date')
+    Participation = apps.get_model('reservations', 'Participation')
+    Date.objects.update(registered_count=Coalesce(Subquery(
+        Participation.objects.filter(date=OuterRef('pk')).order_by().values(
+            'date').annotate(count=Count('id')).values('count')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0008_date_capacity_alter_clinic_capacity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='date',
+            name='registered_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Registered'),
+        ),
+        migrations.RunPython(count_registrations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:02
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def dedupe_dates(apps, schema_editor):
+    """
+    Keeps the oldest Date of every (clinic, datetime_start) pair. The
+    participations of the duplicates are moved to it, unless the member is
+    already registered there, and the duplicates get deleted.
+    """
+    Date = apps.get_model('reservations', 'Date')
+    Participation = apps.get_model('reservations', 'Participation')
+
+    duplicated = Date.objects.values('clinic', 'datetime_start').annotate(
+        count=Count('id'), keep_id=Min('id')).filter(count__gt=1)
+    for group in duplicated:
+        duplicates = Date.objects.filter(
+            clinic=group['clinic'], datetime_start=group['datetime_start']).exclude(id=group['keep_id'])
+        members = set(Participation.objects.filter(
+            date_id=group['keep_id']).values_list('member_id', flat=True))
+        for part in Participation.objects.filter(date__in=duplicates).order_by('date_registered'):
+            if part.member_id not in members:
+                members.add(part.member_id)
+                Participation.objects.filter(id=part.id).update(date_id=group['keep_id'])
+        duplicates.delete()
+        Date.objects.filter(id=group['keep_id']).update(registered_count=len(members))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0009_date_registered_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_dates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0010_dedupe_dates'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='date',
+            constraint=models.UniqueConstraint(fields=('clinic', 'datetime_start'), name='clinic_date_starts_once'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:20
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_event_gender(apps, schema_editor):
+    Date = apps.get_model('reservations', 'Date')
+    Event = apps.get_model('reservations', 'Event')
+    Date.objects.update(eligible_gender=Subquery(
+        Event.objects.filter(clinic__date=OuterRef('pk')).values('gender')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0011_date_unique_clinic_start'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='date',
+            name='eligible_gender',
+            field=models.CharField(choices=[('M', 'Male'), ('F', 'Female'), ('MIXED', 'Mixed')], default='MIXED', editable=False, max_length=7, verbose_name='Gender'),
+        ),
+        migrations.RunPython(copy_event_gender, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:05
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0012_date_eligible_gender'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='clinic',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='clinic_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='date',
+            index=models.Index(fields=['datetime_start'], name='date_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='event_title_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participation',
+            index=models.Index(fields=['date', 'date_registered'], name='participation_date_order_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0013_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='profile_pic_hash',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+    ]
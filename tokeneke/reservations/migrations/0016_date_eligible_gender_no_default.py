@@ -0,0 +1,28 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:59
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_event_gender(apps, schema_editor):
+    # Fixes the Dates created or moved with the MIXED default
+    Date = apps.get_model('reservations', 'Date')
+    Event = apps.get_model('reservations', 'Event')
+    Date.objects.update(eligible_gender=Subquery(
+        Event.objects.filter(clinic__date=OuterRef('pk')).values('gender')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0015_outgoingmail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='date',
+            name='eligible_gender',
+            field=models.CharField(choices=[('M', 'Male'), ('F', 'Female'), ('MIXED', 'Mixed')], editable=False, max_length=7, verbose_name='Gender'),
+        ),
+        migrations.RunPython(copy_event_gender, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0016_date_eligible_gender_no_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='member',
+            name='profile_pic_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
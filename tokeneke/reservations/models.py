@@ -1,4 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (BooleanField, Case, Count, Exists, ExpressionWrapper, F, OuterRef, Prefetch, Q,
+                              Subquery, When, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Least, RowNumber, Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from .validators import validate_percentage
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -10,6 +15,12 @@ from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseU
 from datetime import datetime, timedelta
 from django.core.exceptions import ValidationError
 from .constants import *
+from .cards import bump_date_versions, bump_event_versions
+from .feeds import get_feed_start, touch_schedules
+from .mail import MAIL_MAX_ATTEMPTS
+from .occurrences import get_occurrences
+from .profile_pics import save_variants
+from .waitlist import get_promotions, notify_promotions
 
 """
 Helper functions
@@ -80,6 +91,9 @@ class Member(AbstractBaseUser, PermissionsMixin):
     team = models.CharField(max_length=7, choices=TEAM_CHOICES, blank=True)
     profile_pic = models.ImageField(
         default='profile_pics/default.jpeg', upload_to='profile_pics')
+    # Hash the resized variants of the profile picture are named after, see
+    # profile_pics.py. Set by save() when the picture changes.
+    profile_pic_hash = models.CharField(max_length=16, blank=True, editable=False)
     is_playing = models.BooleanField(default=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
@@ -96,18 +110,82 @@ class Member(AbstractBaseUser, PermissionsMixin):
         else:
             return str(self.email)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        member = super().from_db(db, field_names, values)
+        if 'profile_pic' not in member.get_deferred_fields():
+            # Kept to tell in save() whether the picture changed
+            member._loaded_profile_pic = member.profile_pic.name
+        return member
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if 'profile_pic' in self.get_deferred_fields() or (
+                update_fields is not None and 'profile_pic' not in update_fields):
+            return super().save(*args, **kwargs)
+        if self.process_profile_pic() and update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'profile_pic_hash'}
+        super().save(*args, **kwargs)
+        self._loaded_profile_pic = self.profile_pic.name
+
+    def process_profile_pic(self):
+        """
+        Stores the variants of a new upload and records their hash. A picture
+        changed to another stored file loses its hash, and backfill_profile_pics
+        makes its variants. Returns True if the hash was changed.
+        """
+        if not self.profile_pic._committed:
+            pic_hash = save_variants(self.profile_pic)
+        elif self.profile_pic.name != getattr(self, '_loaded_profile_pic', self.profile_pic.name):
+            pic_hash = ''
+        else:
+            return False
+        changed = pic_hash != self.profile_pic_hash
+        self.profile_pic_hash = pic_hash
+        return changed
+
     def get_fut_participations_registered(self):
         # Returns a query set with the future participations registered for
         return Participation.objects.filter(member=self).filter(date__datetime_start__gte=timezone.now()).order_by('date__datetime_start')
 
+    def get_schedule(self):
+        """
+        Returns a list with the future participations of the member in date
+        order, with their date, clinic and event loaded in the same query. The
+        list is kept on the instance, so it is loaded once per request.
+        """
+        if not hasattr(self, '_schedule'):
+            self._schedule = list(self.get_fut_participations_registered().select_related(
+                'date__clinic__event'))
+        return self._schedule
+
+    async def aget_schedule(self):
+        # get_schedule() for the async views
+        if not hasattr(self, '_schedule'):
+            self._schedule = [part async for part in self.get_fut_participations_registered().select_related(
+                'date__clinic__event')]
+        return self._schedule
+
+    def get_feed_participations(self):
+        # Returns a query set with the participations of the member's feed
+        return Participation.objects.filter(
+            member_id=self.id, date__datetime_start__gte=get_feed_start()).select_related(
+            'date__clinic__event').order_by('date__datetime_start')
+
+    def clear_schedule(self):
+        # The next get_schedule() loads the participations again
+        self.__dict__.pop('_schedule', None)
+
+    def get_schedule_events(self):
+        # Returns a list with the events of the schedule, without repeats
+        events = {}
+        for part in self.get_schedule():
+            events.setdefault(part.date.clinic.event_id, part.date.clinic.event)
+        return list(events.values())
+
     def get_fut_events_registered(self):
         # Returns a query set with the future events registered for
-        partis = self.get_fut_participations_registered()
-        events_ids = set()
-        for part in partis:
-            events_ids.add(part.get_event().id)
-        query_fut_events = Event.objects.filter(id__in=events_ids)
-        return query_fut_events
+        return Event.objects.filter(id__in=[event.id for event in self.get_schedule_events()])
 
     def get_level(self):
         if self.level:
@@ -128,6 +206,59 @@ class Venue(models.Model):
         return self.name
 
 
+class EventQuerySet(models.QuerySet):
+    def with_next_date(self):
+        """
+        Annotates every Event with its next Date (next_date_id, next_date_start),
+        the registered count, remaining spots and fill percentage of that Date.
+        """
+        now = timezone.now()
+        event_dates = Date.objects.filter(clinic__event=OuterRef('pk'))
+        next_date = Date.objects.filter(id=OuterRef('next_date_id'))
+
+        return self.annotate(
+            # Same rule as get_fut_dates: the next future Date, or the last one
+            # if the Event has no future dates left.
+            next_date_id=Coalesce(
+                Subquery(event_dates.filter(datetime_start__gte=now).order_by(
+                    'datetime_start').values('id')[:1]),
+                Subquery(event_dates.order_by('-datetime_start').values('id')[:1])),
+            next_date_start=Subquery(next_date.values('datetime_start')[:1]),
+            next_date_capacity=Subquery(next_date.values('capacity')[:1]),
+            next_registered_count=Coalesce(
+                Subquery(next_date.values('registered_count')[:1]), 0),
+        ).annotate(
+            next_rem_spots=F('next_date_capacity') - F('next_registered_count'),
+            next_fill_pct=Case(
+                When(next_date_capacity__gt=0, then=Least(
+                    F('next_registered_count') * 100 / F('next_date_capacity'), 100)),
+                default=100),
+        )
+
+    def with_summary(self):
+        """
+        Same as with_next_date(), and prefetches the next Date with its
+        participants in registration order. Rendering a list of events with it
+        costs a fixed number of queries. It should be the last call of the
+        chain, since the prefetch filters the dates with the queryset it is
+        called on.
+        """
+        events = self.with_next_date()
+        return events.prefetch_related(
+            self.get_summary_prefetch(events.values('next_date_id')))
+
+    @staticmethod
+    def get_summary_prefetch(next_date_ids):
+        # Returns the prefetch of the next dates of with_summary(), which can
+        # also be passed to prefetch_related_objects() for some of the events.
+        next_dates = Date.objects.filter(id__in=next_date_ids).prefetch_related(
+            Prefetch('participation_set', queryset=Participation.objects.select_related(
+                'member').order_by('date_registered', 'id')))
+        return Prefetch('clinic_set', to_attr='summary_clinics',
+                        queryset=Clinic.objects.prefetch_related(
+                            Prefetch('date_set', queryset=next_dates, to_attr='summary_dates')))
+
+
 class Event(models.Model):
     EVENT_MALE = 'M'
     EVENT_FEMALE = 'F'
@@ -159,12 +290,43 @@ class Event(models.Model):
 
     REQUIRED_FIELDS = ['title', 'gender', 'team']
 
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Trigram index for the title__icontains search, which Postgres runs as
+            # UPPER(title) LIKE UPPER(...).
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'),
+                     name='event_title_trgm_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding:
+            # The eligibility rule is denormalized on the Dates
+            Date.objects.filter(clinic__event=self).update(eligible_gender=self.gender)
+
+    def has_summary(self):
+        # True when the Event comes from EventQuerySet.with_next_date() or with_summary()
+        return hasattr(self, 'next_date_id')
+
     def get_clinics(self):
         return Clinic.objects.filter(event=self)
 
+    def is_eligible(self, member):
+        # Returns True if the member's gender can participate in the Event
+        return self.gender == self.EVENT_MIXED or self.gender == member.gender
+
+    def get_feed_dates(self):
+        # Returns a query set with the Dates of the Event's feed
+        return Date.objects.filter(
+            clinic__event_id=self.id, datetime_start__gte=get_feed_start()).select_related(
+            'clinic').order_by('datetime_start')
+
     def get_fut_dates(self, number=40):
         # Returns a list of the future Dates of the Event's Clinics
         clinics = Clinic.objects.filter(event__id=self.id)
@@ -179,11 +341,29 @@ class Event(models.Model):
             return dates[:number]
         return []
 
+    def get_date_details(self, member, number=40):
+        # get_fut_dates() with the occupancy of every Date for the member, as a list
+        dates = Date.objects.filter(clinic__event__id=self.id).with_occupancy(member)
+        return list(dates.filter(datetime_start__gte=timezone.now()).order_by('datetime_start')[:number]) or list(
+            dates.order_by('-datetime_start')[:number])
+
+    async def aget_date_details(self, member, number=40):
+        # get_date_details() for the async views
+        dates = Date.objects.filter(clinic__event__id=self.id).with_occupancy(member)
+        return [date async for date in dates.filter(datetime_start__gte=timezone.now()).order_by(
+            'datetime_start')[:number]] or [date async for date in dates.order_by('-datetime_start')[:number]]
+
     def get_next_date(self):
         """
         Returns the next single date of the Event. If there are none,
         it returns None.
         """
+        if hasattr(self, 'summary_clinics'):
+            # Prefetched by with_summary()
+            return next((date for clinic in self.summary_clinics
+                         for date in clinic.summary_dates), None)
+        if self.has_summary():
+            return Date.objects.filter(id=self.next_date_id).first()
         try:
             return self.get_fut_dates(1)[0]
         except:
@@ -191,16 +371,15 @@ class Event(models.Model):
 
     def print_next_date(self):
         # Returns the future Date formatted date
-        try:
-            date = self.get_next_date().get_datetime_start()
-            return date.strftime('%A, %b %-d - %I:%M %p')
-        except:
+        next_date_start = self.get_next_date_start()
+        if next_date_start is None:
             return "No more clinics"
+        return timezone.localtime(next_date_start).strftime('%A, %b %-d - %I:%M %p')
 
     def get_remaining_days(self):
         # Returns a string of the remaining days for the fut Date
         try:
-            remaining = (self.get_next_date().datetime_start -
+            remaining = (self.get_next_date_start() -
                          timezone.now()).days
             if remaining < 0:
                 if remaining == -1:
@@ -217,14 +396,29 @@ class Event(models.Model):
         except:
             return "No more clinics"
 
+    def get_next_date_start(self):
+        # Returns the datetime_start of the next Date, or None
+        if self.has_summary():
+            return self.next_date_start
+        fut_date = self.get_next_date()
+        return fut_date.datetime_start if fut_date else None
+
     def get_fullness(self):
         # Returns the fullness of the fut Date
+        if self.has_summary():
+            if self.next_date_id:
+                return '{}%'.format(self.next_fill_pct)
+            return None
         fut_date = self.get_next_date()
         if fut_date:
             return fut_date.get_cap_pct()
 
     def get_fut_date_rem_spots(self):
         # Returns the remaining spots available
+        if self.has_summary():
+            if self.next_date_id:
+                return self.next_rem_spots
+            return "No future date"
         fut_date = self.get_next_date()
         if fut_date:
             return fut_date.get_rem_spots()
@@ -238,6 +432,19 @@ class Event(models.Model):
             "No next date"
 
 
+class ClinicQuerySet(models.QuerySet):
+    def with_next_date(self):
+        """
+        Selects the Event and annotates the start of the next Date as
+        next_date_start, so listing the clinics with their description
+        doesn't query per clinic.
+        """
+        next_date = Date.objects.filter(
+            clinic=OuterRef('pk'), datetime_start__gte=timezone.now()).order_by('datetime_start')
+        return self.select_related('event').annotate(
+            next_date_start=Subquery(next_date.values('datetime_start')[:1]))
+
+
 class Clinic(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     title = title = models.CharField(
@@ -251,10 +458,27 @@ class Clinic(models.Model):
     REQUIRED_FIELDS = ['title', 'start_time',
                        'end_time', 'capacity', 'is_active']
 
+    objects = ClinicQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # materialize_dates pages through the active clinics by id
+            models.Index(fields=['id'], condition=models.Q(is_active=True),
+                         name='clinic_active_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding:
+            # The clinic may have been moved to another event
+            Date.objects.filter(clinic=self).update(eligible_gender=self.event.gender)
+
     def get_event(self):
+        # Uses the Event cached by select_related() when there is one
         try:
-            return Event.objects.get(clinic__id=self.id)
-        except:
+            return self.event
+        except Event.DoesNotExist:
             return None
 
     def get_all_dates(self):
@@ -272,6 +496,11 @@ class Clinic(models.Model):
 
     def get_dates_desc(self):
         # Returns a string with the description of the fut date of the clinic
+        if hasattr(self, 'next_date_start'):
+            # Annotated by ClinicQuerySet.with_next_date()
+            if self.next_date_start is None:
+                return "No More Future Dates"
+            return "On " + timezone.localtime(self.next_date_start).strftime("%-m/%-d, %H:%M")
         try:
             return str("On " + self.get_fut_dates(1)[0].print_start_date())
         except:
@@ -283,58 +512,98 @@ class Clinic(models.Model):
             date = Date.objects.get(
                 clinic_id=self.id, datetime_start=datetime_start)
             return date
-        except:
+        except Date.DoesNotExist:
             return None
 
-    def update_date_instances(self, old_occurrences=None, limit=30):
+    def get_occurrence_datetimes(self, limit=None, until=None):
         """
-        Creates/deletes dates based on the recurrence field. 
-        It accepts a list with the old occurrences in order to compare
-        if there are dates that should be deleted. It only deletes future
-        dates.
+        Expands the recurrence field and returns a dict with the datetime_start
+        of the future occurrences as keys and their datetime_end as values.
+        The occurrences go up to until, which defaults to the current date limit,
+        and only the first limit ones are kept if limit is given.
         """
-        # It will only create future dates
+        now = timezone.now()
         yesterday = datetime.today() - timedelta(days=1)
-        to_create = list(self.recurrences.between(
-            yesterday, date_limit))[:limit]
-        dates_instances = []
-
-        # Checks if old_occurrences has been passed as an argument.
-        if old_occurrences:
-            # Based on the sets, to_create only has the dates that have been added.
-            to_create = list(set(to_create) - set(old_occurrences))[:limit]
-            # Based on the sets, to_delete only has the dates that have been removed.
-            to_delete = list(set(old_occurrences) -
-                             set(self.recurrences.between(yesterday, date_limit)))
-
-            for date in to_delete:
-                datetime_start = make_date_aware(date.replace(
-                    hour=self.start_time.hour, minute=self.start_time.minute, second=0, microsecond=0))
-                date = self.get_date_by_datetime(datetime_start)
-                if date:
-                    date.delete()
-
-        # For creating the dates
-        for date in to_create:
-            datetime_start = make_date_aware(date.replace(
-                hour=self.start_time.hour, minute=self.start_time.minute, second=0, microsecond=0))
-            datetime_end = make_date_aware(date.replace(
-                hour=self.end_time.hour, minute=self.end_time.minute, second=0, microsecond=0))
-            date = Date(clinic=self, datetime_start=datetime_start,
-                        datetime_end=datetime_end, capacity=self.capacity)
-            dates_instances.append(date)
-
-        Date.objects.bulk_create(dates_instances)
-
-    def update_dates_capacity(self):
+        until = until or get_date_limit()
+        occurrences = get_occurrences(self.recurrences, self.start_time, self.end_time,
+                                      yesterday.date(), until.date(), limit)
+        # The expansion is cached for the whole day, so the past occurrences are
+        # dropped here. It will only create future dates.
+        return {datetime_start: datetime_end for datetime_start, datetime_end in
+                ((make_date_aware(start), make_date_aware(end)) for start, end in occurrences)
+                if datetime_start >= now}
+
+    def get_new_dates(self, occurrences, last_datetime_start=None):
         """
-        Updates the capacity of all the Date instances
-        that are will happen in the future
+        Returns a list with the unsaved Date instances of the occurrences
+        that start after last_datetime_start.
         """
-        dates = self.get_fut_dates()
-        for date in dates:
-            date.capacity = self.capacity
-            date.save()
+        return [Date(clinic=self, datetime_start=datetime_start, datetime_end=datetime_end,
+                     capacity=self.capacity, eligible_gender=self.event.gender)
+                for datetime_start, datetime_end in occurrences.items()
+                if last_datetime_start is None or datetime_start > last_datetime_start]
+
+    def update_date_instances(self, old_occurrences=None, limit=None, sync_capacity=False):
+        """
+        Reconciles the future Date instances with the recurrence field and the
+        times of the clinic. old_occurrences are the get_occurrence_datetimes()
+        of the clinic before it was edited: the dates of the occurrences removed
+        from the rule get deleted with one query, the added ones get created
+        with one bulk_create and the dates of the kept ones get the new end
+        time with one bulk_update. The dates moved or deleted by the staff are
+        left as they are. Without old_occurrences, the missing dates are created
+        and nothing is deleted or moved. If sync_capacity is True, the capacity
+        of the future dates is set to the clinic's one too. limit caps the
+        number of dates created. It only touches future dates and returns a
+        dict with the amount of dates created, deleted and updated.
+        """
+        # Not capped, so no date is deleted or recreated because of the count
+        occurrences = self.get_occurrence_datetimes()
+        removed = (old_occurrences or {}).keys() - occurrences.keys()
+        fut_dates = Date.objects.filter(
+            clinic=self, datetime_start__gte=timezone.now())
+
+        missing = dict(occurrences)
+        to_delete = []
+        to_update = []
+        for date in fut_dates:
+            if date.datetime_start in removed:
+                to_delete.append(date.id)
+                continue
+            datetime_end = missing.pop(date.datetime_start, None)
+            # Only the end times the edit changed, the staff may have moved the others
+            end_changed = datetime_end is not None and old_occurrences is not None and \
+                old_occurrences.get(date.datetime_start) != datetime_end
+            if end_changed or (sync_capacity and date.capacity != self.capacity):
+                if end_changed:
+                    date.datetime_end = datetime_end
+                if sync_capacity:
+                    date.capacity = self.capacity
+                to_update.append(date)
+
+        if old_occurrences is not None:
+            # Only the occurrences added to the rule, the staff may have deleted the others
+            missing = {datetime_start: datetime_end for datetime_start, datetime_end in missing.items()
+                       if datetime_start not in old_occurrences}
+        to_create = self.get_new_dates(dict(list(missing.items())[:limit]))
+
+        with transaction.atomic():
+            if to_delete:
+                Date.objects.filter(id__in=to_delete).delete()
+            # Upserts, in case a concurrent reconciliation created some of them first
+            Date.objects.bulk_create(
+                to_create, update_conflicts=True, unique_fields=['clinic', 'datetime_start'],
+                update_fields=['datetime_end', 'capacity'])
+            Date.objects.bulk_update(to_update, ['datetime_end', 'capacity'])
+
+        if to_create or to_update:
+            # bulk_create and bulk_update don't send post_save
+            bump_event_versions([self.event_id])
+        registered = [date.id for date in to_update if date.registered_count]
+        if registered:
+            touch_schedules(Participation.objects.filter(
+                date_id__in=registered).values_list('member_id', flat=True))
+        return {'created': len(to_create), 'deleted': len(to_delete), 'updated': len(to_update)}
 
     def __str__(self):
         event = self.get_event()
@@ -347,6 +616,75 @@ class Clinic(models.Model):
             return str("No event yet - " + self.get_dates_desc())
 
 
+class DateQuerySet(models.QuerySet):
+    def add_registered_count(self, count_by_date):
+        """
+        Atomically adds to the registered_count of the Dates. It takes a dict
+        of date ids to the amount to add (negative to subtract) and runs one
+        UPDATE per distinct amount.
+        """
+        date_ids_by_count = {}
+        for date_id, count in count_by_date.items():
+            date_ids_by_count.setdefault(count, []).append(date_id)
+        for count, date_ids in date_ids_by_count.items():
+            if count:
+                self.filter(id__in=date_ids).update(
+                    registered_count=F('registered_count') + count)
+
+    def for_calendar(self, member, start, end):
+        """
+        Returns the values of the Dates starting in [start, end) for the
+        calendar page, in start order: their event, remaining spots and
+        whether the member is registered. It is one range query on the
+        datetime_start index.
+        """
+        return self.filter(datetime_start__gte=start, datetime_start__lt=end).annotate(
+            title=F('clinic__event__title'),
+            event_id=F('clinic__event_id'),
+            rem_spots=F('capacity') - F('registered_count'),
+            registered=Exists(Participation.objects.filter(member_id=member.id, date=OuterRef('pk'))),
+        ).order_by('datetime_start').values(
+            'id', 'datetime_start', 'datetime_end', 'title', 'event_id', 'rem_spots', 'registered')
+
+    def with_occupancy(self, member):
+        """
+        Annotates the Dates with what the event page shows to the member:
+        rem_spots, registrable, registered and waitlist_rank, the member's
+        place on the waitlist (None when on court or not registered). It's
+        one query, the positions ranked with a window over date_registered.
+        """
+        ranked = Participation.objects.filter(date_id__in=self.values('id')).annotate(
+            position=Window(RowNumber(), partition_by=F('date_id'),
+                            order_by=[F('date_registered').asc(), F('id').asc()]),
+        ).values('date_id', 'member_id', 'position')
+        sql, params = ranked.query.sql_with_params()
+        # Django 4.1 can't filter on window functions, so the member's position is picked in SQL
+        position = RawSQL(
+            f'SELECT ranked.position FROM ({sql}) ranked '
+            f'WHERE ranked.date_id = {Date._meta.db_table}.id AND ranked.member_id = %s',
+            (*params, member.id), output_field=models.IntegerField())
+        return self.annotate(
+            rem_spots=F('capacity') - F('registered_count'),
+            registrable=ExpressionWrapper(
+                Q(datetime_start__gte=timezone.now() + REGISTRATION_CLOSES_BEFORE), output_field=BooleanField()),
+            position=position,
+        ).annotate(
+            registered=ExpressionWrapper(Q(position__isnull=False), output_field=BooleanField()),
+            waitlist_rank=Case(When(position__gt=F('capacity'), then=F('position') - F('capacity'))),
+        )
+
+    def reconcile_registered_count(self):
+        """
+        Recounts the participations of the Dates and fixes the registered_count
+        of the ones that drifted. Returns the number of Dates fixed.
+        """
+        counted = Coalesce(Subquery(Participation.objects.filter(date=OuterRef('pk')).order_by(
+        ).values('date').annotate(count=Count('id')).values('count')), 0)
+        drifted = self.annotate(counted=counted).exclude(
+            registered_count=F('counted')).values('id')
+        return Date.objects.filter(id__in=Subquery(drifted)).update(registered_count=counted)
+
+
 class Date(models.Model):
     clinic = models.ForeignKey(Clinic, on_delete=models.CASCADE)
     datetime_start = models.DateTimeField(blank=False, null=False)
@@ -354,8 +692,30 @@ class Date(models.Model):
     participants = models.ManyToManyField(
         Member, through='Participation', blank=True)
     capacity = models.IntegerField("Capacity", default=12)
+    # Denormalized count of participations, kept up to date by Participation
+    # and ParticipationQuerySet. The reconcile_registered_counts command fixes drift.
+    registered_count = models.IntegerField(
+        "Registered", default=0, editable=False)
+    # Eligibility rule denormalized from the Event, so registrations can be
+    # validated without joining the Clinic and the Event. Set by save(), and
+    # by the Event and Clinic when they change.
+    eligible_gender = models.CharField(
+        "Gender", max_length=7, choices=Event.PART_GENDER_CHOICES, editable=False)
     REQUIRED_FIELDS = ['datetime_start', 'datetime_end', 'capacity']
 
+    objects = DateQuerySet.as_manager()
+
+    class Meta:
+        # The unique constraint also indexes the (clinic, datetime_start) lookups
+        constraints = [
+            models.UniqueConstraint(
+                fields=['clinic', 'datetime_start'], name='clinic_date_starts_once'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['datetime_start'], name='date_start_idx'),
+        ]
+
     def __str__(self):
         date = self.get_datetime_start().strftime("%A %-m/%-d, %H:%M")
         return str(self.get_event_name() + ' on ' + date)
@@ -363,12 +723,25 @@ class Date(models.Model):
     def __hash__(self):
         return hash((self.datetime_start,))
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'clinic' in update_fields:
+            # The Date may be new or moved to another clinic
+            self.eligible_gender = Event.objects.values_list('gender', flat=True).get(clinic__id=self.clinic_id)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'eligible_gender'}
+        super().save(*args, **kwargs)
+
     # def __eq__(self, other):
     #     return (self.datetime_start, ) == (other.datetime_start, )
 
+    def is_eligible(self, member):
+        # Returns True if the member can participate in the Date
+        return self.eligible_gender == Event.EVENT_MIXED or self.eligible_gender == member.gender
+
     def is_registrable(self):
         time_until = self.datetime_start - make_aware(datetime.now())
-        if time_until < timedelta(hours=24):
+        if time_until < REGISTRATION_CLOSES_BEFORE:
             return False
         else:
             return True
@@ -376,9 +749,17 @@ class Date(models.Model):
     def get_clinic(self):
         return Clinic.objects.get(date=self)
 
+    def has_prefetched_parts(self):
+        return 'participation_set' in getattr(self, '_prefetched_objects_cache', {})
+
     def get_all_parts(self):
-        # Returns a list with all the participants with the ones that first registered first
-        return [(i.member) for i in Participation.objects.filter(date__id=self.id).order_by('date_registered')]
+        # Returns a list with all the participants with the ones that first registered first.
+        # Ties are broken by id, as the waitlist promotions and ranks do.
+        if self.has_prefetched_parts():
+            # Prefetched by EventQuerySet.with_summary(), already in registration order
+            return [part.member for part in self.participation_set.all()]
+        return [part.member for part in Participation.objects.filter(
+            date__id=self.id).select_related('member').order_by('date_registered', 'id')]
 
     def get_parts_on_court(self):
         all_parts = self.get_all_parts()
@@ -396,6 +777,9 @@ class Date(models.Model):
         return timezone.localtime(self.datetime_start)
 
     def get_event_name(self):
+        if Date.clinic.is_cached(self) and Clinic.event.is_cached(self.clinic):
+            # Selected with select_related('clinic__event')
+            return self.clinic.event.title
         try:
             return Event.objects.get(clinic__date__id=self.id).title
         except:
@@ -413,7 +797,7 @@ class Date(models.Model):
             return "No event found"
 
     def get_registered_count(self):
-        return Participation.objects.filter(date__id=self.id).count()
+        return self.registered_count
 
     def get_capacity(self):
         return self.capacity
@@ -426,7 +810,79 @@ class Date(models.Model):
         if cap_pct > 1:
             return 1
         else:
-            return '{:.0%}'.format(1 - self.get_rem_spots() / self.get_capacity())
+            return '{:.0%}'.format(cap_pct)
+
+
+class ParticipationQuerySet(models.QuerySet):
+    """
+    Checks the eligibility and keeps Date.registered_count in sync on the
+    bulk paths, which skip Participation.save() and delete(). The many to
+    many manager of Date.participants goes through these too.
+    """
+
+    def check_eligibility(self, participations):
+        """
+        Raises a ValidationError if any of the participations is for a Date
+        the member can't participate in. It takes one query per gender
+        instead of one per participation.
+        """
+        member_field = Participation._meta.get_field('member')
+        members = {part.member_id: part.member for part in participations
+                   if member_field.is_cached(part)}
+        missing = {part.member_id for part in participations} - members.keys()
+        members.update(Member.objects.using(self.db).in_bulk(missing))
+
+        date_ids_by_gender = {}
+        for part in participations:
+            date_ids_by_gender.setdefault(
+                members[part.member_id].gender, set()).add(part.date_id)
+        for gender, date_ids in date_ids_by_gender.items():
+            date = Date.objects.using(self.db).filter(id__in=date_ids).exclude(
+                eligible_gender__in=[Event.EVENT_MIXED, gender]).first()
+            if date:
+                member = next(members[part.member_id] for part in participations
+                              if part.date_id == date.id and members[part.member_id].gender == gender)
+                raise ValidationError(
+                    f"{str(member)} can't participate in a event for {date.get_eligible_gender_display().lower()}s.")
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        self.check_eligibility(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            date_ids = {obj.date_id for obj in objs}
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # There is no way to know which rows were inserted, so it recounts.
+                Date.objects.filter(id__in=date_ids).reconcile_registered_count()
+            else:
+                count_by_date = {}
+                for obj in objs:
+                    count_by_date[obj.date_id] = count_by_date.get(obj.date_id, 0) + 1
+                Date.objects.add_registered_count(count_by_date)
+            # bulk_create doesn't send post_save, so the cards are invalidated here
+            bump_date_versions(date_ids)
+            touch_schedules(obj.member_id for obj in objs)
+        return objs
+
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            # Locks the rows so a concurrent delete of the same rows can't
+            # decrement the counters twice.
+            rows = list(self.order_by().select_for_update().values_list('id', 'date_id', 'member_id'))
+            promotions = get_promotions([id for id, _, _ in rows], {date_id for _, date_id, _ in rows}, self.db)
+            deleted = self.model._base_manager.using(self.db).filter(
+                id__in=[id for id, _, _ in rows]).delete()
+            count_by_date = {}
+            for _, date_id, _ in rows:
+                count_by_date[date_id] = count_by_date.get(date_id, 0) - 1
+            Date.objects.add_registered_count(count_by_date)
+            bump_date_versions(count_by_date)
+            touch_schedules(member_id for _, _, member_id in rows)
+            notify_promotions(promotions)
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
 
 
 class Participation(models.Model):
@@ -437,20 +893,49 @@ class Participation(models.Model):
 
     REQUIRED_FIELDS = ['member', 'date']
 
+    objects = ParticipationQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
-        event = Event.objects.get(clinic__date=self.date)
-        if event.gender != 'MIXED' and event.gender != self.member.gender:
+        if not self.date.is_eligible(self.member):
             raise ValidationError(
-                f"{str(self.member)} can't participate in a event for {event.get_gender_display().lower()}s.")
+                f"{str(self.member)} can't participate in a event for {self.date.get_eligible_gender_display().lower()}s.")
         else:
-            super().save(*args, **kwargs)
+            with transaction.atomic():
+                if self._state.adding:
+                    old_date_id = None
+                else:
+                    old_date_id = Participation.objects.filter(
+                        id=self.id).values_list('date_id', flat=True).first()
+                super().save(*args, **kwargs)
+                if old_date_id != self.date_id:
+                    Date.objects.add_registered_count({self.date_id: 1})
+                    if old_date_id:
+                        Date.objects.add_registered_count({old_date_id: -1})
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            promotions = get_promotions([self.id], [self.date_id])
+            deleted = super().delete(*args, **kwargs)
+            # A concurrent delete of the same row may have deleted it first
+            if deleted[0]:
+                Date.objects.add_registered_count({self.date_id: -1})
+                bump_date_versions([self.date_id])
+                touch_schedules([self.member_id])
+                notify_promotions(promotions)
+        return deleted
 
     class Meta:
+        # The unique constraint also indexes the lookups by member
         constraints = [
             models.UniqueConstraint(
                 fields=['member', 'date'], name='member_can_sign_in_once'
             )
         ]
+        indexes = [
+            # Participants of a Date in registration order
+            models.Index(fields=['date', 'date_registered'],
+                         name='participation_date_order_idx'),
+        ]
 
     def get_event(self):
         try:
@@ -462,3 +947,39 @@ class Participation(models.Model):
 
     def __str__(self):
         return str(self.member) + " for " + str(self.date)
+
+
+class OutgoingMailQuerySet(models.QuerySet):
+    def due(self):
+        # Returns the mails waiting to be sent whose next attempt is due
+        return self.filter(sent_at__isnull=True, next_attempt_at__lte=timezone.now(),
+                           attempts__lt=MAIL_MAX_ATTEMPTS)
+
+
+class OutgoingMail(models.Model):
+    """
+    A mail of the outbox. The requests only insert them, through
+    mail.OutboxEmailBackend, and the deliver_mail command sends them.
+    """
+    subject = models.CharField(max_length=255, blank=True)
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField()
+    # The MIME message, as the SMTP backend would send it
+    message = models.BinaryField()
+    created_at = models.DateTimeField(default=timezone.now)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    objects = OutgoingMailQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # The mails still to send, in the order they are due
+            models.Index(fields=['next_attempt_at'], condition=models.Q(sent_at__isnull=True),
+                         name='outgoingmail_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.recipients)}"
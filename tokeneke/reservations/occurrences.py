@@ -0,0 +1,64 @@
+"""
+Memoized expansion of the clinics' recurrence fields.
+
+Expanding django-recurrence rules is slow pure Python, so the expanded
+occurrences are cached in two tiers: an LRU cache local to the process and
+the shared Django cache. Entries are keyed by the serialized rule, the clinic
+times and the window, which is rounded to whole days so a key stays valid
+for the whole day.
+"""
+import hashlib
+from datetime import datetime, time
+from functools import lru_cache
+
+import recurrence
+from django.core.cache import cache
+from django.utils import timezone
+
+# Number of expansions kept by each process
+LOCAL_CACHE_SIZE = 512
+# Seconds the expansions are kept in the shared cache
+SHARED_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_occurrences(recurrences, start_time, end_time, after, before, limit=None):
+    """
+    Returns a tuple with the (datetime_start, datetime_end) naive pairs of the
+    occurrences of the recurrences between the after and before dates, with
+    the clinic's start and end times. Only the first limit occurrences are
+    returned if limit is given.
+    """
+    return _expand(recurrence.serialize(recurrences), start_time, end_time, after, before, limit)
+
+
+@lru_cache(maxsize=LOCAL_CACHE_SIZE)
+def _expand(rule, start_time, end_time, after, before, limit):
+    key = 'occurrences:' + hashlib.sha1('|'.join(
+        [rule, str(start_time), str(end_time), str(after), str(before), str(limit)]).encode()).hexdigest()
+    occurrences = cache.get(key)
+    if occurrences is None:
+        occurrences = _expand_rule(rule, start_time, end_time, after, before, limit)
+        cache.set(key, occurrences, SHARED_CACHE_TIMEOUT)
+    return occurrences
+
+
+def _expand_rule(rule, start_time, end_time, after, before, limit):
+    recurrences = recurrence.deserialize(rule)
+    # The rule starts on the window's first day, instead of the moment it gets
+    # expanded, so the same window always gives the same occurrences. A later
+    # DTSTART of the rule, like the start of a season, is kept.
+    recurrences.include_dtstart = False
+    after = datetime.combine(after, time.min)
+    dtstart = after
+    if recurrences.dtstart:
+        rule_start = recurrences.dtstart
+        if timezone.is_aware(rule_start):
+            rule_start = timezone.make_naive(rule_start)
+        dtstart = max(datetime.combine(rule_start.date(), time.min), after)
+    occurrences = recurrences.between(
+        after, datetime.combine(before, time.min), inc=True, dtstart=dtstart)
+    start_time = time(start_time.hour, start_time.minute)
+    end_time = time(end_time.hour, end_time.minute)
+    return tuple(
+        (datetime.combine(occurrence.date(), start_time), datetime.combine(occurrence.date(), end_time))
+        for occurrence in list(occurrences)[:limit])
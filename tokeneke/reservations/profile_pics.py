@@ -0,0 +1,75 @@
+"""
+Resized variants of the members' profile pictures.
+
+The uploads are kept as they are, and turned into a square thumbnail and
+avatar, in WebP and JPEG, without their EXIF data, when they are uploaded.
+The variants are named after a hash of the upload, so their URLs never
+change and can be cached for good, and a picture shared by many members,
+like the default one, is stored once.
+"""
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Side in pixels of each variant, about twice the size they are shown at
+VARIANTS = {'thumb': 64, 'avatar': 256}
+# Pillow's save options of each format, by file extension
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpg': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True},
+}
+VARIANTS_DIRECTORY = 'profile_pics/variants'
+HASH_LENGTH = 16
+
+
+def get_variant_name(pic_hash, variant, extension):
+    return f'{VARIANTS_DIRECTORY}/{pic_hash}-{VARIANTS[variant]}.{extension}'
+
+
+def get_variant_url(pic_hash, variant, extension):
+    return default_storage.url(get_variant_name(pic_hash, variant, extension))
+
+
+def load_image(data):
+    # Returns the image upright, in RGB over white and without its metadata
+    image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    image = image.convert('RGB')
+    # Drops the EXIF data, the ICC profile and the comments
+    image.info = {}
+    return image
+
+
+def render_variant(image, size, options):
+    # Returns the bytes of the image cropped to a square of the size
+    output = BytesIO()
+    ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS).save(output, **options)
+    return output.getvalue()
+
+
+def save_variants(picture):
+    """
+    Stores the variants of the picture, an open file, that aren't stored
+    yet, and returns the hash they are named after.
+    """
+    picture.seek(0)
+    data = picture.read()
+    picture.seek(0)
+    pic_hash = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    image = None
+    for variant, size in VARIANTS.items():
+        for extension, options in FORMATS.items():
+            name = get_variant_name(pic_hash, variant, extension)
+            if default_storage.exists(name):
+                continue
+            if image is None:
+                image = load_image(data)
+            default_storage.save(name, ContentFile(render_variant(image, size, options)))
+    return pic_hash
@@ -0,0 +1,46 @@
+"""
+Registration of members for the dates of an event.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Date, Member, Participation
+
+
+def update_registrations(member, event, date_ids):
+    """
+    Makes the member's participations for the event's dates match date_ids.
+    Participations for dates that are no longer selected get deleted and the
+    ones for newly selected dates get created, all in one transaction and
+    with a fixed number of queries whatever the amount of dates.
+    Returns a tuple with the number of participations created and deleted.
+    """
+    date_ids = {int(id) for id in date_ids}
+    # Eligibility only depends on the event, so it is checked once for all dates.
+    if date_ids and not event.is_eligible(member):
+        raise ValidationError(
+            f"You can't sign up for an event for {event.get_gender_display()}s.")
+
+    with transaction.atomic():
+        # Locking the member serializes concurrent submissions of the same member,
+        # so the diff below is computed against the latest registrations.
+        Member.objects.select_for_update().filter(id=member.id).exists()
+        old_date_ids = set(Participation.objects.filter(
+            member=member, date__clinic__event=event).values_list('date_id', flat=True))
+
+        to_create = date_ids - old_date_ids
+        if to_create:
+            # Ids that don't belong to the event's dates are ignored
+            to_create = Date.objects.filter(
+                id__in=to_create, clinic__event=event).values_list('id', flat=True)
+            to_create = Participation.objects.bulk_create(
+                [Participation(member=member, date_id=date_id) for date_id in to_create])
+
+        deleted = 0
+        to_delete = old_date_ids - date_ids
+        if to_delete:
+            deleted, _ = Participation.objects.filter(
+                member=member, date_id__in=to_delete).delete()
+    member.clear_schedule()
+
+    return len(to_create), deleted
@@ -0,0 +1,79 @@
+"""
+Routing of the reads of the read-heavy views to the replica databases.
+
+Only the views decorated with read_from_replica read from a replica, so
+every other read, and all the writes, go to the primary. A member who just
+wrote sticks to the primary for REPLICA_STICKY_SECONDS, so they read their
+own writes while the replicas catch up.
+"""
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY_DATABASE = 'default'
+STICKY_SESSION_KEY = 'primary_until'
+
+# Alias of the replica the current request reads from, None for the primary
+_read_database = ContextVar('read_database', default=None)
+
+
+def get_read_database():
+    return _read_database.get()
+
+
+def stick_to_primary(request):
+    # Sends the reads of the member to the primary for a while after a write
+    request.session[STICKY_SESSION_KEY] = time.time() + settings.REPLICA_STICKY_SECONDS
+
+
+def is_stuck_to_primary(request):
+    return request.session.get(STICKY_SESSION_KEY, 0) > time.time()
+
+
+def read_from_replica(view):
+    """
+    Decorator of the read-only views, sync or async, that sends their reads
+    to one of the replicas picked at random, unless the member wrote recently.
+    """
+    def get_database(request):
+        if settings.REPLICA_DATABASES and not is_stuck_to_primary(request):
+            return random.choice(settings.REPLICA_DATABASES)
+        return None
+
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _read_database.set(get_database(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_database.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _read_database.set(get_database(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_database.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return get_read_database() or PRIMARY_DATABASE
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DATABASE
@@ -0,0 +1,96 @@
+"""
+Synthetic club data, used to reproduce production scale locally and in the
+benchmarks and tests.
+"""
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .models import Clinic, Date, Event, Member, Participation
+
+SEED_EMAIL_DOMAIN = 'seed.tokeneke.test'
+SEED_PASSWORD = 'tokeneke-seed'
+
+FIRST_NAMES = ['Mariano', 'Sherine', 'Tom', 'Anna', 'Lucas', 'Emma', 'Peter', 'Olivia',
+               'James', 'Sofia', 'Daniel', 'Mia', 'Robert', 'Grace', 'Michael', 'Chloe']
+LAST_NAMES = ['Jalif', 'Salem', 'Smith', 'Johnson', 'Brown', 'Miller', 'Davis', 'Garcia',
+              'Wilson', 'Moore', 'Taylor', 'Clark', 'Lewis', 'Walker', 'Hall', 'Young']
+EVENT_NAMES = ['Morning Drill', 'Afternoon Clinic', 'Evening Doubles', 'Cardio Tennis',
+               'Match Play', 'Round Robin', 'Stroke Of The Week', 'Serve And Volley']
+RULES = [
+    'RRULE:FREQ=WEEKLY;BYDAY=TU',
+    'RRULE:FREQ=WEEKLY;BYDAY=MO,WE',
+    'RRULE:FREQ=WEEKLY;BYDAY=TU,TH,SA',
+    'RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=FR',
+    'RRULE:FREQ=DAILY',
+]
+
+
+def seed_club(members=200, events=40, clinics_per_event=1, seed=0):
+    """
+    Creates members, events, clinics with realistic recurrences, their
+    materialized dates and participations. The same seed always gives the
+    same club. Returns a dict with the amount of rows created.
+    """
+    rand = random.Random(seed)
+    now = timezone.now()
+    password = make_password(SEED_PASSWORD)
+    first_id = Member.objects.count()
+
+    new_members = Member.objects.bulk_create([
+        Member(email=f'member{first_id + i}@{SEED_EMAIL_DOMAIN}',
+               password=password,
+               member_n=str(1000 + first_id + i),
+               first_name=rand.choice(FIRST_NAMES),
+               last_name=rand.choice(LAST_NAMES),
+               gender=rand.choice([Member.GENDER_MALE, Member.GENDER_FEMALE]),
+               level=rand.randint(20, 90),
+               team=rand.choice(Member.TEAM_CHOICES)[0])
+        for i in range(members)], batch_size=1000)
+
+    new_events = Event.objects.bulk_create([
+        Event(title=f'{rand.choice(EVENT_NAMES)} {i + 1}',
+              description='Generated by seed_club',
+              gender=rand.choice(Event.PART_GENDER_CHOICES)[0],
+              team=rand.choice(Event.TEAM_CHOICES)[0])
+        for i in range(events)])
+
+    clinics = []
+    for event in new_events:
+        for i in range(clinics_per_event):
+            start_hour = rand.randint(7, 19)
+            clinics.append(Clinic(
+                event=event,
+                title=f'{event.title} - {i + 1}',
+                recurrences=rand.choice(RULES),
+                start_time=datetime.time(start_hour, rand.choice([0, 30])),
+                end_time=datetime.time(start_hour + rand.choice([1, 2]), 0),
+                capacity=rand.choice([4, 8, 12, 16])))
+    clinics = Clinic.objects.bulk_create(clinics)
+
+    dates = []
+    for clinic in clinics:
+        dates += clinic.get_new_dates(clinic.get_occurrence_datetimes(limit=30))
+    dates = Date.objects.bulk_create(dates, batch_size=1000)
+
+    members_by_gender = {gender: [member for member in new_members if member.gender == gender]
+                         for gender, _ in Member.GENDER_CHOICES}
+    participations = []
+    for date in dates:
+        if date.eligible_gender == Event.EVENT_MIXED:
+            eligible = new_members
+        else:
+            eligible = members_by_gender[date.eligible_gender]
+        # Dates are fuller the closer they are, and some get a waitlist
+        weeks_ahead = (date.datetime_start - now).days // 7
+        count = max(0, date.capacity + 3 - weeks_ahead * 2 + rand.randint(-3, 3))
+        for minutes, member in enumerate(rand.sample(eligible, min(count, len(eligible)))):
+            participations.append(Participation(
+                member=member, date=date,
+                date_registered=now - datetime.timedelta(days=7) + datetime.timedelta(minutes=minutes)))
+    Participation.objects.bulk_create(participations, batch_size=1000)
+
+    return {'members': len(new_members), 'events': len(new_events), 'clinics': len(clinics),
+            'dates': len(dates), 'participations': len(participations)}
@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .backends import get_member_cache_key
+from .cards import bump_date_versions, bump_event_versions
+from .feeds import touch_schedules
+from .middleware import add_query_recorder
+from .models import Clinic, Date, Event, Member, Participation
+from .waitlist import get_promotions, notify_promotions
+
+
+@receiver(connection_created)
+def record_connection_queries(sender, connection, **kwargs):
+    # RequestMetricsMiddleware times the queries of the connections of every
+    # thread, the async ORM runs them in other threads than the middleware.
+    add_query_recorder(connection)
+
+
+@receiver(pre_delete, sender=Member)
+def release_member_spots(sender, instance, **kwargs):
+    # The member's participations are removed by the cascade, which doesn't
+    # go through Participation.delete(), so the counters are updated and the
+    # waitlists promoted here.
+    dates = Date.objects.filter(participation__member=instance)
+    parts = list(Participation.objects.filter(member=instance).values_list('id', 'date_id'))
+    notify_promotions(get_promotions([id for id, _ in parts], [date_id for _, date_id in parts]))
+    bump_date_versions(dates.values_list('id', flat=True))
+    dates.update(registered_count=F('registered_count') - 1)
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+def invalidate_cached_member(sender, instance, **kwargs):
+    # The next request loads the Member from the database again
+    cache.delete(get_member_cache_key(instance.pk))
+
+
+@receiver(post_save, sender=Member)
+def invalidate_member_cards(sender, instance, created, update_fields=None, **kwargs):
+    # The cards show the names and pictures of the participants. Logging in
+    # only saves last_login.
+    if not created and update_fields != frozenset(['last_login']):
+        bump_date_versions(Date.objects.filter(
+            participation__member=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_card(sender, instance, **kwargs):
+    bump_event_versions([instance.id])
+
+
+@receiver(post_save, sender=Clinic)
+@receiver(post_delete, sender=Clinic)
+def invalidate_clinic_card(sender, instance, **kwargs):
+    bump_event_versions([instance.event_id])
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Clinic)
+def invalidate_event_schedules(sender, instance, created, **kwargs):
+    # The feeds of the registered members show the event's title
+    if not created:
+        event_id = instance.id if sender is Event else instance.event_id
+        touch_schedules(Participation.objects.filter(
+            date__clinic__event_id=event_id).values_list('member_id', flat=True))
+
+
+@receiver(post_save, sender=Date)
+@receiver(post_delete, sender=Date)
+def invalidate_date_card(sender, instance, **kwargs):
+    bump_date_versions([instance.id])
+
+
+@receiver(post_save, sender=Date)
+@receiver(pre_delete, sender=Date)
+def invalidate_date_schedules(sender, instance, created=False, **kwargs):
+    # Moved or deleted dates leave the feeds of their participants
+    if not created and instance.registered_count:
+        touch_schedules(Participation.objects.filter(
+            date_id=instance.id).values_list('member_id', flat=True))
+
+
+# Participations are deleted in bulk and by cascade, so their deletes
+# invalidate the cards in ParticipationQuerySet.delete() and
+# Participation.delete(), which keeps the cascades from loading every row.
+@receiver(post_save, sender=Participation)
+def invalidate_participation_card(sender, instance, **kwargs):
+    bump_date_versions([instance.date_id])
+    touch_schedules([instance.member_id])
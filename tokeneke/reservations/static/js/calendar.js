@@ -6,3 +6,65 @@ function handleCellClick(cell) {
 		cell.style.backgroundColor = 'white'
 	}
 }
+
+// Dates of the month shown, loaded from the calendar feed a month at a time
+var shownMonth = new Date(new Date().getFullYear(), new Date().getMonth(), 1);
+var loadedMonths = {};
+
+function getMonthDates(month) {
+	// Returns a promise with the dates of the month, asked once per page
+	var start = month;
+	var end = new Date(month.getFullYear(), month.getMonth() + 1, 1);
+	var key = start.toISOString();
+	if (!loadedMonths[key]) {
+		var url = document.getElementById('calendar-month').dataset.url;
+		var params = new URLSearchParams({start: start.toISOString(), end: end.toISOString()});
+		loadedMonths[key] = fetch(url + '?' + params).then(function (response) {
+			return response.json();
+		}).then(function (data) {
+			return data.dates;
+		});
+	}
+	return loadedMonths[key];
+}
+
+function showMonth(month) {
+	shownMonth = month;
+	document.getElementById('calendar-title').textContent =
+		month.toLocaleDateString(undefined, {month: 'long', year: 'numeric'});
+	getMonthDates(month).then(function (dates) {
+		var list = document.getElementById('calendar-dates');
+		list.innerHTML = '';
+		dates.forEach(function (date) {
+			var item = document.createElement('li');
+			var link = document.createElement('a');
+			link.href = '/event/' + date.event_id;
+			link.textContent = new Date(date.start).toLocaleString(undefined, {
+				weekday: 'short', month: 'numeric', day: 'numeric', hour: 'numeric', minute: '2-digit'
+			}) + ' - ' + date.title;
+			item.appendChild(link);
+			var spots = date.rem_spots > 0 ? ' (' + date.rem_spots + ' spots left)' : ' (Full)';
+			item.appendChild(document.createTextNode(spots + (date.registered ? ' - Registered' : '')));
+			if (date.registered) {
+				item.classList.add('registered');
+			}
+			list.appendChild(item);
+		});
+		if (!dates.length) {
+			list.innerHTML = '<li>No clinics this month</li>';
+		}
+	});
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+	if (!document.getElementById('calendar-month')) {
+		return;
+	}
+	document.getElementById('calendar-prev').addEventListener('click', function () {
+		showMonth(new Date(shownMonth.getFullYear(), shownMonth.getMonth() - 1, 1));
+	});
+	document.getElementById('calendar-next').addEventListener('click', function () {
+		showMonth(new Date(shownMonth.getFullYear(), shownMonth.getMonth() + 1, 1));
+	});
+	showMonth(shownMonth);
+});
@@ -17,6 +17,8 @@ file.addEventListener('change', function(){
     if (chosenFile) {
         const reader = new FileReader();
         reader.addEventListener('load', function(){
+            // The WebP <source> of the current picture would win over the preview
+            img.parentElement.querySelectorAll('source').forEach(source => source.remove());
             img.setAttribute('src', reader.result);
         });
 
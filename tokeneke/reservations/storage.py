@@ -0,0 +1,50 @@
+"""
+Storage of the collected static files. On top of the names with a hash of
+their content, which the proxy caches for good, it writes a gzip and a
+brotli compressed copy of the text files next to them, so the proxy serves
+them without compressing them on every request.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.map', '.json', '.svg', '.txt', '.xml', '.ico', '.ttf', '.otf', '.eot')
+# Smaller files don't gain enough to pay for the extra lookup
+COMPRESS_MIN_SIZE = 512
+
+
+def get_compressed_copies(data):
+    # Returns {extension: compressed data} of the encodings that make the data smaller
+    copies = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli:
+        copies['.br'] = brotli.compress(data, quality=11)
+    return {extension: copy for extension, copy in copies.items() if len(copy) < len(data)}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # The original names are served too, to the files that aren't
+        # referenced through the static tag
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSED_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return
+        for extension, copy in get_compressed_copies(data).items():
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            self._save(name + extension, ContentFile(copy))
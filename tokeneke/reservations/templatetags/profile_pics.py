@@ -0,0 +1,23 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..profile_pics import get_variant_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def profile_pic(member, variant='thumb', **attrs):
+    """
+    Renders the profile picture of the member in the variant, 'thumb' or
+    'avatar', as WebP with a JPEG fallback. A picture without variants yet
+    is rendered as it was uploaded. The keyword arguments are added to the
+    <img> as attributes.
+    """
+    attrs = format_html_join('', ' {}="{}"', attrs.items())
+    if not member.profile_pic_hash:
+        return format_html('<img src="{}" alt="{}" loading="lazy"{}>', member.profile_pic.url, member, attrs)
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp"><img src="{}" alt="{}" loading="lazy"{}></picture>',
+        get_variant_url(member.profile_pic_hash, variant, 'webp'),
+        get_variant_url(member.profile_pic_hash, variant, 'jpg'), member, attrs)
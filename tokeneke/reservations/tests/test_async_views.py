@@ -0,0 +1,68 @@
+from django.test import TestCase, override_settings
+from django.urls import path
+from django.utils.http import urlencode
+from .. import async_views, urls
+from ..models import *
+import datetime
+import json
+
+# The urls of SERVER_MODE=asgi
+urlpatterns = [
+    path('', async_views.home, name='home'),
+    path('filter_events', async_views.filter_events, name='filter_events'),
+    path('event/<int:event_id>', async_views.event, name='event'),
+    path('calendar/feed', async_views.calendar_feed, name='calendar_feed'),
+] + urls.urlpatterns
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], ROOT_URLCONF=__name__, CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test_async_views'}})
+class TestAsyncViews(TestCase):
+    def setUp(self):
+        self.member = Member.objects.create_user("maj_jalif@gmail.com", "mariano", gender="M")
+        self.event = Event.objects.create(title="Men's Clinic", gender="M")
+        Clinic.objects.create(
+            event=self.event,
+            recurrences="RRULE:FREQ=DAILY",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30),
+            capacity=4
+        ).update_date_instances(limit=5)
+        self.dates = list(self.event.get_fut_dates(5))
+        Participation.objects.create(member=self.member, date=self.dates[2])
+        self.async_client.force_login(self.member)
+
+    async def test_home(self):
+        response = await self.async_client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['titles'], {
+            'Registered Dates': 1, 'Registered Events': 1, 'Events Available': 1})
+        self.assertContains(response, f'/event/{self.event.id}')
+
+    async def test_event(self):
+        response = await self.async_client.get(f'/event/{self.event.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['dates'], self.dates)
+        self.assertEqual([date.registered for date in response.context['dates']], [date == self.dates[2] for date in self.dates])
+
+    async def test_filter_events(self):
+        response = await self.async_client.post('/filter_events', urlencode({
+            'input': 'men', 'curr_events': json.dumps(["Men's Clinic", "Juniors"])}),
+            content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.json(), {'data': ["Men's Clinic"]})
+
+    async def test_calendar_feed(self):
+        start = self.dates[0].datetime_start
+        response = await self.async_client.get('/calendar/feed', {
+            'start': start.isoformat(), 'end': (start + datetime.timedelta(days=7)).isoformat()})
+        dates = response.json()['dates']
+        self.assertEqual([date['id'] for date in dates], [date.id for date in self.dates])
+        self.assertEqual([date['registered'] for date in dates], [date == self.dates[2] for date in self.dates])
+        response = await self.async_client.get('/calendar/feed', {'start': start.isoformat()})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_login_required(self):
+        self.async_client.cookies.clear()
+        response = await self.async_client.get(f'/event/{self.event.id}')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/login'))
@@ -0,0 +1,56 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from ..models import *
+import tempfile
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TestCachedModelBackend(TestCase):
+    def setUp(self):
+        self.member = Member.objects.create_user("maj_jalif@gmail.com", "mariano",
+                                                 first_name="Mariano", last_name="Jalif", gender="M")
+        self.client.force_login(self.member, 'reservations.backends.CachedModelBackend')
+        # Loads the member in the cache
+        self.client.get('/edit_profile')
+
+    def get_auth_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/edit_profile')
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in ctx if 'django_session' in query['sql']
+                          or 'FROM "reservations_member" WHERE "reservations_member"."id"' in query['sql']]
+
+    def test_session_and_member_come_from_the_cache(self):
+        response, queries = self.get_auth_queries()
+        self.assertEqual(queries, [])
+        self.assertEqual(response.wsgi_request.user, self.member)
+
+    def test_saving_the_member_invalidates_it(self):
+        self.member.first_name = "Tom"
+        self.member.save()
+        response, queries = self.get_auth_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.wsgi_request.user.first_name, "Tom")
+
+    def test_inactive_members_are_logged_out(self):
+        self.member.is_active = False
+        self.member.save()
+        response = self.client.get('/edit_profile')
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+
+class TestFileCachedModelBackend(TestCachedModelBackend):
+    """The file backend stands in for a cache shared with other processes"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory.name}})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(caches['default'].close)
+        super().setUp()
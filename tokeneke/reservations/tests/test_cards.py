@@ -0,0 +1,75 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from ..cards import add_cards
+from ..models import *
+import datetime
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test_cards'}})
+class TestEventCards(TestCase):
+    def setUp(self):
+        self.mariano = Member.objects.create_user(
+            "maj_jalif@gmail.com", "mariano", first_name="Mariano", last_name="Jalif", gender="M")
+        self.tom = Member.objects.create_user(
+            "tom@gmail.com", "tom", first_name="Tom", last_name="Smith", gender="M")
+        self.event = Event.objects.create(title="Men's Clinic", gender="M")
+        clinic = Clinic.objects.create(
+            event=self.event,
+            recurrences="RRULE:FREQ=WEEKLY;BYDAY=TU",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30),
+            capacity=2
+        )
+        clinic.update_date_instances()
+        self.next_date = self.event.get_next_date()
+        Participation.objects.create(member=self.mariano, date=self.next_date)
+
+    def get_card(self, user=None):
+        events = Event.objects.filter(id=self.event.id).with_next_date()
+        with CaptureQueriesContext(connection) as ctx:
+            event, = add_cards(events, user or self.mariano)
+        return event.card_html, len(ctx)
+
+    def test_cached_cards_skip_the_prefetch(self):
+        card, cold_queries = self.get_card()
+        self.assertIn("1 spot left", card)
+        self.assertIn('alt="Mariano J."', card)
+        cached_card, warm_queries = self.get_card()
+        self.assertEqual(cached_card, card)
+        # Only the events with their next date
+        self.assertEqual(warm_queries, 1)
+        self.assertLess(warm_queries, cold_queries)
+
+    def test_registrations_invalidate_the_card(self):
+        self.get_card()
+        Participation.objects.create(member=self.tom, date=self.next_date)
+        card, _ = self.get_card()
+        self.assertIn("Full", card)
+        self.assertIn('alt="Tom S."', card)
+        Participation.objects.filter(member=self.tom).delete()
+        card, _ = self.get_card()
+        self.assertIn("1 spot left", card)
+        self.assertNotIn('alt="Tom S."', card)
+
+    def test_event_and_date_changes_invalidate_the_card(self):
+        self.get_card()
+        self.event.title = "Men's Morning Clinic"
+        self.event.save()
+        self.assertIn("Morning Clinic", self.get_card()[0])
+        date = Date.objects.get(id=self.next_date.id)
+        date.capacity = 4
+        date.save()
+        self.assertIn("3 spots left", self.get_card()[0])
+
+    def test_member_changes_invalidate_the_card(self):
+        self.get_card()
+        self.mariano.first_name = "Marian"
+        self.mariano.save()
+        self.assertIn('alt="Marian J."', self.get_card()[0])
+
+    def test_staff_get_their_own_card(self):
+        staff = Member.objects.create_superuser("admin@gmail.com", "admin", gender="M")
+        self.assertNotIn('edit_event', self.get_card()[0])
+        self.assertIn(f'/edit_event/{self.event.id}', self.get_card(staff)[0])
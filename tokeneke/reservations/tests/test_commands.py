@@ -0,0 +1,150 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from ..constants import get_date_limit
+from ..models import *
+from ..seed import seed_club
+import datetime
+import json
+import os
+import tempfile
+
+
+def create_clinic(title, rule, is_active=True):
+    return Clinic.objects.create(
+        event=Event.objects.create(title=title, gender="MIXED"),
+        title=title,
+        recurrences=rule,
+        start_time=datetime.time(8, 30),
+        end_time=datetime.time(9, 30),
+        is_active=is_active
+    )
+
+
+class TestMaterializeDates(TestCase):
+    def test_extends_active_clinics_only(self):
+        active = create_clinic("Tuesdays", "RRULE:FREQ=WEEKLY;BYDAY=TU")
+        inactive = create_clinic("Wednesdays", "RRULE:FREQ=WEEKLY;BYDAY=WE", is_active=False)
+        call_command('materialize_dates', batch_size=1, stdout=StringIO())
+        self.assertEqual(active.get_fut_dates(None).count(),
+                         len(active.get_occurrence_datetimes()))
+        self.assertEqual(inactive.get_all_dates().count(), 0)
+
+    def test_keeps_existing_dates(self):
+        """Dates moved by the staff are not recreated nor deleted"""
+        clinic = create_clinic("Tuesdays", "RRULE:FREQ=WEEKLY;BYDAY=TU")
+        clinic.update_date_instances(limit=3)
+        first, second, last = clinic.get_fut_dates()
+        second.datetime_start += datetime.timedelta(hours=2)
+        second.save()
+        call_command('materialize_dates', stdout=StringIO())
+        dates = list(clinic.get_all_dates())
+        self.assertIn(second, dates)
+        self.assertEqual(len(dates), len(clinic.get_occurrence_datetimes()))
+        self.assertTrue(all(date.datetime_start > last.datetime_start for date in dates[3:]))
+
+    def test_goes_up_to_the_horizon(self):
+        """The horizon bounds the dates, not the number of occurrences"""
+        clinic = create_clinic("Every day", "RRULE:FREQ=DAILY")
+        call_command('materialize_dates', stdout=StringIO())
+        last = clinic.get_all_dates().last()
+        self.assertGreater(clinic.get_all_dates().count(), 30)
+        self.assertEqual(last.datetime_start.date(), get_date_limit().date())
+
+    def test_limit_caps_the_dates(self):
+        clinic = create_clinic("Every day", "RRULE:FREQ=DAILY")
+        call_command('materialize_dates', limit=5, stdout=StringIO())
+        # The limit counts from yesterday, before the past occurrences are dropped
+        self.assertIn(clinic.get_all_dates().count(), [3, 4])
+
+
+class TestMaterializeDatesWorkers(TransactionTestCase):
+    def test_workers_give_the_same_dates(self):
+        clinics = [create_clinic(f"Clinic {i}", "RRULE:FREQ=DAILY") for i in range(4)]
+        call_command('materialize_dates', workers=2, batch_size=3, stdout=StringIO())
+        for clinic in clinics:
+            self.assertEqual(clinic.get_fut_dates(None).count(),
+                             len(clinic.get_occurrence_datetimes()))
+
+
+class TestReconcileRegisteredCounts(TestCase):
+    def test_fixes_drifted_counts(self):
+        clinic = create_clinic("Tuesdays", "RRULE:FREQ=WEEKLY;BYDAY=TU")
+        clinic.update_date_instances()
+        date = clinic.get_fut_dates(1)[0]
+        Participation.objects.create(
+            member=Member.objects.create(email="maj_jalif@gmail.com", gender="M"), date=date)
+        Date.objects.update(registered_count=5)
+        out = StringIO()
+        call_command('reconcile_registered_counts', stdout=out)
+        date.refresh_from_db()
+        self.assertEqual(date.registered_count, 1)
+        self.assertIn(f'{Date.objects.count()} dates', out.getvalue())
+
+
+class TestSeedClub(TestCase):
+    def test_seed_is_deterministic(self):
+        call_command('seed_club', members=30, events=5, seed=7, stdout=StringIO())
+        titles = list(Event.objects.order_by('id').values_list('title', flat=True))
+        rules = [str(clinic.recurrences) for clinic in Clinic.objects.order_by('id')]
+        Event.objects.all().delete()
+        Member.objects.all().delete()
+        seed_club(members=30, events=5, seed=7)
+        self.assertEqual(list(Event.objects.order_by('id').values_list('title', flat=True)), titles)
+        self.assertEqual([str(clinic.recurrences) for clinic in Clinic.objects.order_by('id')], rules)
+
+    def test_seeded_data_is_consistent(self):
+        created = seed_club(members=30, events=5)
+        self.assertEqual(Member.objects.count(), created['members'])
+        self.assertEqual(Date.objects.count(), created['dates'])
+        self.assertEqual(Participation.objects.count(), created['participations'])
+        self.assertEqual(Date.objects.reconcile_registered_count(), 0)
+
+
+class TestBenchmarkViews(TestCase):
+    def test_writes_results_for_every_page(self):
+        seed_club(members=30, events=5)
+        Member.objects.create_superuser("admin@gmail.com", "admin", gender="M")
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            call_command('benchmark_views', iterations=2, output=output, stdout=StringIO())
+            call_command('benchmark_views', iterations=2, output=output, compare=output,
+                         stdout=StringIO())
+            with open(output) as results_file:
+                results = json.load(results_file)
+        self.assertEqual(set(results['views']), {
+            'home', 'my_events', 'event', 'event_participants', 'add_participant',
+            'edit_clinic', 'edit_clinic_save'})
+        self.assertTrue(all(view['queries'] > 0 for view in results['views'].values()))
+
+
+class TestBenchmarkViewsReplicas(TransactionTestCase):
+    """A TransactionTestCase, since replica0 only sees committed data"""
+    databases = {'default', 'replica0'}
+
+    def get_queries(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            call_command('benchmark_views', iterations=1, output=output, stdout=StringIO())
+            with open(output) as results_file:
+                return {name: view['queries'] for name, view in json.load(results_file)['views'].items()}
+
+    def test_counts_the_queries_of_the_replicas(self):
+        seed_club(members=10, events=2)
+        Member.objects.create_superuser("admin@gmail.com", "admin", gender="M")
+        primary = self.get_queries()
+        with override_settings(REPLICA_DATABASES=['replica0']):
+            self.assertEqual(self.get_queries(), primary)
+
+
+class TestBenchmarkConnections(TransactionTestCase):
+    """A TransactionTestCase, since the command closes the connection"""
+
+    def test_reuses_the_connection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'connections.json')
+            call_command('benchmark_connections', iterations=5, output=output, stdout=StringIO())
+            with open(output) as results_file:
+                results = json.load(results_file)
+        self.assertEqual(results['new']['connections'], 5)
+        self.assertEqual(results['persistent']['connections'], 1)
@@ -0,0 +1,141 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from ..feeds import fold, get_member_feed_token
+from ..models import *
+from ..registrations import update_registrations
+import datetime
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test_feeds'}})
+class TestFeeds(TestCase):
+    def setUp(self):
+        self.member = Member.objects.create_user("maj_jalif@gmail.com", "mariano", gender="M")
+        self.event = Event.objects.create(title="Men's Clinic, Tuesdays", gender="M")
+        self.clinic = Clinic.objects.create(
+            event=self.event,
+            title="Courts 1-3",
+            recurrences="RRULE:FREQ=WEEKLY;BYDAY=TU,TH",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30)
+        )
+        self.clinic.update_date_instances(limit=6)
+        self.dates = list(self.event.get_fut_dates(3))
+        update_registrations(self.member, self.event, [date.id for date in self.dates])
+        self.url = f'/feeds/member/{get_member_feed_token(self.member)}.ics'
+
+    def get_feed(self, url, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, **headers)
+            content = b''.join(response.streaming_content).decode() if response.streaming else ''
+        return response, content, len(ctx)
+
+    def test_member_feed_is_one_query(self):
+        response, content, queries = self.get_feed(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertEqual(queries, 1)
+        self.assertEqual(content.count('BEGIN:VEVENT'), 3)
+        self.assertIn("SUMMARY:Men's Clinic\\, Tuesdays\r\n", content)
+        start = self.dates[0].datetime_start.astimezone(datetime.timezone.utc)
+        self.assertIn(f'DTSTART:{start:%Y%m%dT%H%M%SZ}\r\n', content)
+        self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(content.endswith('END:VCALENDAR\r\n'))
+
+    def test_repeat_polls_get_a_304_without_queries(self):
+        response, _, _ = self.get_feed(self.url)
+        response, _, queries = self.get_feed(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(queries, 0)
+        response, _, _ = self.get_feed(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_registration_changes_send_the_feed_again(self):
+        response, _, _ = self.get_feed(self.url)
+        update_registrations(self.member, self.event, [self.dates[0].id])
+        response, content, _ = self.get_feed(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content.count('BEGIN:VEVENT'), 1)
+
+    def test_moved_dates_send_the_feed_again(self):
+        response, _, _ = self.get_feed(self.url)
+        date = Date.objects.get(id=self.dates[1].id)
+        date.datetime_end += datetime.timedelta(hours=1)
+        date.save()
+        response, _, _ = self.get_feed(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_tokens_are_not_found(self):
+        response, _, _ = self.get_feed(f'/feeds/member/{self.member.id}:forged.ics')
+        self.assertEqual(response.status_code, 404)
+
+    def test_event_feed(self):
+        response, content, _ = self.get_feed(f'/feeds/event/{self.event.id}.ics')
+        self.assertEqual(content.count('BEGIN:VEVENT'), 6)
+        self.assertIn("SUMMARY:Men's Clinic\\, Tuesdays - Courts 1-3\r\n", content)
+        response, _, _ = self.get_feed(f'/feeds/event/{self.event.id}.ics',
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.clinic.title = "Courts 4-6"
+        self.clinic.save()
+        response, _, _ = self.get_feed(f'/feeds/event/{self.event.id}.ics',
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_long_lines_are_folded(self):
+        line = 'SUMMARY:' + 'é' * 60
+        folded = fold(line)
+        self.assertTrue(all(len(part.encode()) <= 75 for part in folded.rstrip('\r\n').split('\r\n')))
+        self.assertEqual(folded.replace('\r\n ', '').rstrip('\r\n'), line)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test_calendar_feed'}})
+class TestCalendarFeed(TestCase):
+    def setUp(self):
+        self.member = Member.objects.create_user("maj_jalif@gmail.com", "mariano", gender="M")
+        self.event = Event.objects.create(title="Men's Clinic", gender="M")
+        Clinic.objects.create(
+            event=self.event,
+            recurrences="RRULE:FREQ=DAILY",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30),
+            capacity=4
+        ).update_date_instances(limit=60)
+        self.dates = list(self.event.get_fut_dates(60))
+        self.start = self.dates[0].datetime_start
+        self.client.force_login(self.member)
+
+    def get_window(self, days=14):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/calendar/feed', {
+                'start': self.start.isoformat(),
+                'end': (self.start + datetime.timedelta(days=days)).isoformat()})
+        return response, [query for query in ctx if 'reservations_date' in query['sql']]
+
+    def test_window_dates(self):
+        Participation.objects.create(member=self.member, date=self.dates[1])
+        response, queries = self.get_window()
+        dates = response.json()['dates']
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([date['id'] for date in dates], [date.id for date in self.dates[:14]])
+        self.assertEqual([date['registered'] for date in dates[:3]], [False, True, False])
+        self.assertEqual(dates[1]['rem_spots'], 3)
+        self.assertEqual(dates[1]['title'], "Men's Clinic")
+        self.assertEqual(dates[1]['event_id'], self.event.id)
+
+    def test_windows_are_cached_until_the_member_registers(self):
+        self.get_window()
+        response, queries = self.get_window()
+        self.assertEqual(queries, [])
+        update_registrations(self.member, self.event, [self.dates[2].id])
+        response, queries = self.get_window()
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(response.json()['dates'][2]['registered'])
+
+    def test_invalid_windows(self):
+        self.assertEqual(self.get_window(days=60)[0].status_code, 400)
+        self.assertEqual(self.get_window(days=-1)[0].status_code, 400)
+        response = self.client.get('/calendar/feed', {'start': 'monday', 'end': '2026-10-31'})
+        self.assertEqual(response.status_code, 400)
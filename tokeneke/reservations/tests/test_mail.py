@@ -0,0 +1,164 @@
+from io import StringIO
+from django.core import mail as django_mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from ..mail import MAIL_MAX_ATTEMPTS, MAIL_RETRY_DELAY, claim_due_mail
+from ..models import *
+import datetime
+import email
+import socketserver
+import threading
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib, without extensions"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply('220 localhost SMTP stand-in')
+        mail_from, recipients = None, []
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO', 'NOOP'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                mail_from = command.split(':', 1)[1].strip()
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                if server.failures:
+                    server.failures -= 1
+                    self.reply('451 Try again later')
+                    continue
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                server.messages.append((mail_from, recipients, email.message_from_bytes(data)))
+                mail_from, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'RSET':
+                mail_from, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    """Local stand-in of the SMTP server, which records the mails it receives"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.failures = 0
+        self.messages = []
+
+
+class TestOutbox(TestCase):
+    def setUp(self):
+        self.smtp = SMTPServer()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        settings = override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            EMAIL_BACKEND='reservations.mail.OutboxEmailBackend',
+            OUTBOX_EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.members = [Member.objects.create_user(f"member{i}@gmail.com", "pass", gender="M")
+                        for i in range(3)]
+
+    def reset_password(self, member):
+        return self.client.post('/reset_password', {'email': member.email})
+
+    def deliver(self):
+        call_command('deliver_mail', once=True, stdout=StringIO())
+
+    def test_request_only_inserts_a_row(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.reset_password(self.members[0])
+        self.assertEqual(response.status_code, 302)
+        inserts = [query['sql'] for query in ctx if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertIn('reservations_outgoingmail', inserts[0])
+        self.assertEqual(self.smtp.messages, [])
+
+    def test_delivers_over_one_connection(self):
+        for member in self.members:
+            self.reset_password(member)
+        self.deliver()
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual([recipients for _, recipients, _ in self.smtp.messages],
+                         [[f'<{member.email}>'] for member in self.members])
+        self.assertIn('Password reset', self.smtp.messages[0][2]['Subject'])
+        self.assertFalse(OutgoingMail.objects.filter(sent_at__isnull=True).exists())
+
+    def test_retries_with_backoff(self):
+        self.reset_password(self.members[0])
+        self.smtp.failures = 1
+        self.deliver()
+        mail = OutgoingMail.objects.get()
+        self.assertEqual((mail.attempts, mail.sent_at), (1, None))
+        self.assertIn('451', mail.last_error)
+        self.assertGreater(mail.next_attempt_at, timezone.now() + datetime.timedelta(seconds=MAIL_RETRY_DELAY - 5))
+        # It isn't due yet
+        self.deliver()
+        self.assertEqual(self.smtp.messages, [])
+
+        OutgoingMail.objects.update(next_attempt_at=timezone.now())
+        self.deliver()
+        mail.refresh_from_db()
+        self.assertEqual(mail.attempts, 2)
+        self.assertIsNotNone(mail.sent_at)
+        self.assertEqual(len(self.smtp.messages), 1)
+
+    def test_gives_up(self):
+        self.reset_password(self.members[0])
+        OutgoingMail.objects.update(attempts=MAIL_MAX_ATTEMPTS)
+        self.deliver()
+        self.assertEqual(self.smtp.connections, 0)
+
+    def test_claimed_mails_wait_for_the_lease(self):
+        """A worker that dies after claiming its batch leaves it to be retried later"""
+        self.reset_password(self.members[0])
+        self.assertEqual(len(claim_due_mail(10)), 1)
+        self.assertEqual(claim_due_mail(10), [])
+        OutgoingMail.objects.update(next_attempt_at=timezone.now())
+        self.deliver()
+        mail = OutgoingMail.objects.get()
+        self.assertEqual(mail.attempts, 2)
+        self.assertIsNotNone(mail.sent_at)
+
+    @override_settings(EMAIL_TIMEOUT=30)
+    def test_lease_covers_the_batch(self):
+        for member in self.members:
+            self.reset_password(member)
+        claim_due_mail(10)
+        # Three mails of up to 30 seconds each, longer than the first retry delay
+        for mail in OutgoingMail.objects.all():
+            self.assertGreater(mail.next_attempt_at, timezone.now() + datetime.timedelta(seconds=85))
+
+    def test_any_email_backend(self):
+        self.reset_password(self.members[0])
+        with override_settings(OUTBOX_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            self.deliver()
+        self.assertEqual(self.smtp.connections, 0)
+        self.assertEqual(django_mail.outbox[0].recipients(), [self.members[0].email])
+        self.assertIn(b'Password reset', django_mail.outbox[0].message().as_bytes(linesep='\r\n'))
+        self.assertIsNotNone(OutgoingMail.objects.get().sent_at)
@@ -0,0 +1,82 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from .. import metrics
+from ..middleware import RequestMetricsMiddleware
+from ..models import *
+import tempfile
+
+
+class TestRequestMetrics(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            ALLOWED_HOSTS=['testserver'], METRICS_DIR=directory.name, METRICS_FLUSH_INTERVAL=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for histograms in metrics._histograms.values():
+            histograms.clear()
+        self.staff = Member.objects.create_superuser("admin@gmail.com", "admin", gender="M")
+        self.member = Member.objects.create_user("maj_jalif@gmail.com", "mariano", gender="M")
+
+    def test_metrics_are_exposed_per_view(self):
+        self.client.force_login(self.member)
+        self.client.get('/')
+        self.client.get('/')
+        self.client.get('/my_events')
+        self.client.force_login(self.staff)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('tokeneke_request_duration_seconds_count{view="home"} 2', body)
+        self.assertIn('tokeneke_request_duration_seconds_count{view="my_events"} 1', body)
+        self.assertIn('# TYPE tokeneke_request_sql_queries histogram', body)
+
+    async def test_async_requests_record_the_queries_of_other_threads(self):
+        def count_members():
+            try:
+                return Member.objects.count()
+            finally:
+                connection.close()
+
+        async def get_response(request):
+            # The async ORM runs the queries in other threads, with their own connections
+            await sync_to_async(count_members, thread_sensitive=False)()
+            return HttpResponse()
+
+        middleware = RequestMetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        await middleware(RequestFactory().get('/'))
+        self.assertEqual(metrics._histograms['tokeneke_request_sql_queries']['unresolved']['sum'], 1)
+
+    def test_metrics_are_staff_only(self):
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get('/metrics').status_code, 302)
+
+    def test_duplicate_queries_are_counted(self):
+        metrics.observe('home', 0.2, 10, 0.05, 3)
+        metrics.observe('home', 0.02, 4, 0.01, 0)
+        histogram = metrics.collect()['tokeneke_request_sql_duplicate_queries']['home']
+        self.assertEqual(histogram['sum'], 3)
+        self.assertEqual(histogram['count'], 2)
+
+    def test_histograms_of_all_processes_are_added_up(self):
+        metrics.observe('home', 0.2, 10, 0.05, 0)
+        metrics.flush()
+        # Another worker wrote its own file
+        with open(f'{metrics.settings.METRICS_DIR}/1.json', 'w') as snapshot_file:
+            snapshot_file.write(open(f'{metrics.settings.METRICS_DIR}/{metrics.os.getpid()}.json').read())
+        histogram = metrics.collect()['tokeneke_request_duration_seconds']['home']
+        self.assertEqual(histogram['count'], 2)
+        self.assertEqual(histogram['buckets'][metrics.DURATION_BUCKETS.index(0.25)], 2)
+        self.assertEqual(histogram['buckets'][metrics.DURATION_BUCKETS.index(0.1)], 0)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0, METRICS_SLOW_REQUEST_SAMPLE_RATE=1)
+    def test_slow_requests_are_logged(self):
+        self.client.force_login(self.member)
+        with self.assertLogs('reservations.middleware', 'WARNING') as logs:
+            self.client.get('/my_events')
+        self.assertIn('Slow request GET /my_events (my_events)', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
@@ -1,4 +1,6 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction, IntegrityError
 from ..models import *
 import datetime
 from django.core.exceptions import ValidationError
@@ -57,3 +59,371 @@ class TestParticipation(TestCase):
         
         
 
+
+
+class TestEventSummary(TestCase):
+    def setUp(self):
+        self.members = [Member.objects.create(
+            email=f"member{i}@gmail.com", first_name="Member", last_name=str(i), gender="M")
+            for i in range(3)]
+        for i in range(3):
+            event = Event.objects.create(
+                title=f"Men's Clinic {i}", gender="M", team="No-Team")
+            clinic = Clinic.objects.create(
+                event=event,
+                title=f"Clinic {i}",
+                recurrences="RRULE:FREQ=WEEKLY;BYDAY=TU",
+                start_time=datetime.time(8, 30),
+                end_time=datetime.time(9, 30),
+                capacity=2
+            )
+            clinic.update_date_instances()
+        self.event = Event.objects.get(title="Men's Clinic 0")
+        next_date = self.event.get_next_date()
+        for member in self.members:
+            Participation.objects.create(member=member, date=next_date)
+
+    def test_summary_matches_per_event_methods(self):
+        """with_summary() returns the same card values as the per-event lookups"""
+        plain = Event.objects.get(id=self.event.id)
+        summary = Event.objects.filter(id=self.event.id).with_summary()[0]
+        self.assertEqual(summary.get_next_date(), plain.get_next_date())
+        self.assertEqual(summary.print_next_date(), plain.print_next_date())
+        self.assertEqual(summary.get_remaining_days(), plain.get_remaining_days())
+        self.assertEqual(summary.get_fut_date_rem_spots(), -1)
+        self.assertEqual(summary.get_fullness(), '100%')
+        self.assertEqual(summary.get_participants(), self.members)
+
+    def test_summary_query_count_is_fixed(self):
+        """Rendering every card costs the same queries whatever the event count"""
+        def render_cards():
+            for event in Event.objects.with_summary():
+                (event.print_next_date(), event.get_fut_date_rem_spots(), event.get_fullness(),
+                 event.get_remaining_days(), event.get_participants())
+
+        with self.assertNumQueries(4):
+            render_cards()
+        Clinic.objects.create(
+            event=Event.objects.create(title="Ladies Clinic", gender="F"),
+            recurrences="RRULE:FREQ=WEEKLY;BYDAY=WE",
+            start_time=datetime.time(10, 0),
+            end_time=datetime.time(11, 0)
+        ).update_date_instances()
+        with self.assertNumQueries(4):
+            render_cards()
+
+
+class TestRegisteredCount(TestCase):
+    def setUp(self):
+        self.members = [Member.objects.create(
+            email=f"member{i}@gmail.com", first_name="Member", last_name=str(i), gender="F")
+            for i in range(3)]
+        clinic = Clinic.objects.create(
+            event=Event.objects.create(title="Ladies Clinic", gender="F"),
+            recurrences="RRULE:FREQ=WEEKLY;BYDAY=TU",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30)
+        )
+        clinic.update_date_instances()
+        self.date = clinic.get_fut_dates(1)[0]
+
+    def assertRegisteredCount(self, count):
+        self.date.refresh_from_db()
+        self.assertEqual(self.date.get_registered_count(), count)
+        self.assertEqual(count, Participation.objects.filter(date=self.date).count())
+
+    def test_counter_follows_single_and_bulk_changes(self):
+        part = Participation.objects.create(member=self.members[0], date=self.date)
+        self.assertRegisteredCount(1)
+        Participation.objects.bulk_create(
+            [Participation(member=member, date=self.date) for member in self.members[1:]])
+        self.assertRegisteredCount(3)
+        part.delete()
+        self.assertRegisteredCount(2)
+        Participation.objects.filter(date=self.date).delete()
+        self.assertRegisteredCount(0)
+
+    def test_double_delete_decrements_once(self):
+        Participation.objects.bulk_create([Participation(member=member, date=self.date) for member in self.members])
+        # Two copies of the same row, as two concurrent requests would load it
+        part = Participation.objects.get(member=self.members[0])
+        stale = Participation.objects.get(member=self.members[0])
+        part.delete()
+        self.assertEqual(stale.delete()[0], 0)
+        self.assertRegisteredCount(2)
+
+    def test_counter_follows_participants_edits(self):
+        """Edits through Date.participants, as the Date admin does"""
+        self.date.participants.set(self.members)
+        self.assertRegisteredCount(3)
+        self.date.participants.set(self.members[:1])
+        self.assertRegisteredCount(1)
+
+    def test_counter_follows_member_deletion(self):
+        self.date.participants.set(self.members)
+        self.members[0].delete()
+        self.assertRegisteredCount(2)
+
+    def test_reconcile_fixes_drift(self):
+        self.date.participants.set(self.members)
+        Date.objects.filter(id=self.date.id).update(registered_count=10)
+        self.assertEqual(Date.objects.reconcile_registered_count(), 1)
+        self.assertRegisteredCount(3)
+        self.assertEqual(Date.objects.reconcile_registered_count(), 0)
+
+
+class TestUpdateDateInstances(TestCase):
+    def setUp(self):
+        self.clinic = Clinic.objects.create(
+            event=Event.objects.create(title="Mixed Clinic", gender="MIXED"),
+            recurrences="RRULE:FREQ=WEEKLY;BYDAY=TU",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30),
+            capacity=8
+        )
+        self.changes = self.clinic.update_date_instances()
+        # The occurrences before the edits of the tests, as edit_clinic passes them
+        self.old_occurrences = self.clinic.get_occurrence_datetimes(limit=None)
+
+    def get_weekdays(self):
+        return {date.get_datetime_start().weekday() for date in self.clinic.get_fut_dates()}
+
+    def test_only_changed_occurrences_are_touched(self):
+        self.assertEqual(self.changes['deleted'], 0)
+        self.assertEqual(self.changes['created'], self.clinic.get_fut_dates().count())
+        tuesdays = set(self.clinic.get_fut_dates().values_list('id', flat=True))
+
+        self.clinic.recurrences = "RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=TU"
+        self.clinic.save()
+        self.clinic.refresh_from_db()
+        changes = self.clinic.update_date_instances(self.old_occurrences)
+        self.assertEqual((changes['created'], changes['updated']), (0, 0))
+        removed = self.old_occurrences.keys() - self.clinic.get_occurrence_datetimes(limit=None).keys()
+        self.assertEqual(changes['deleted'], len(removed))
+        self.assertEqual(len(removed), len(tuesdays) // 2)
+        self.assertEqual(self.get_weekdays(), {1})
+        self.assertTrue(set(self.clinic.get_fut_dates().values_list('id', flat=True)) < tuesdays)
+
+        self.assertEqual(self.clinic.update_date_instances(self.clinic.get_occurrence_datetimes(limit=None)),
+                         {'created': 0, 'deleted': 0, 'updated': 0})
+
+    def test_time_change_replaces_dates(self):
+        self.clinic.start_time = datetime.time(10, 0)
+        self.clinic.end_time = datetime.time(11, 0)
+        changes = self.clinic.update_date_instances(self.old_occurrences)
+        self.assertEqual(changes['created'], changes['deleted'])
+        self.assertEqual(
+            {date.get_datetime_start().time() for date in self.clinic.get_fut_dates()},
+            {datetime.time(10, 0)})
+
+    def test_end_time_and_capacity_are_updated(self):
+        self.clinic.end_time = datetime.time(10, 0)
+        self.clinic.capacity = 4
+        changes = self.clinic.update_date_instances(self.old_occurrences, sync_capacity=True)
+        self.assertEqual(changes['updated'], self.clinic.get_fut_dates().count())
+        self.assertEqual(set(self.clinic.get_fut_dates().values_list('capacity', flat=True)), {4})
+
+    def test_staff_changes_are_kept(self):
+        """Moved and deleted dates stay so, and the cap doesn't delete the last dates"""
+        member = Member.objects.create(email="maj_jalif@gmail.com", gender="M")
+        moved, deleted = self.clinic.get_fut_dates(2)
+        moved.datetime_start += datetime.timedelta(days=1)
+        moved.datetime_end += datetime.timedelta(days=1)
+        moved.save()
+        Participation.objects.create(member=member, date=moved)
+        deleted.delete()
+        last = Date.objects.filter(clinic=self.clinic).latest('datetime_start')
+        Participation.objects.create(member=member, date=last)
+        count = Date.objects.filter(clinic=self.clinic).count()
+
+        self.clinic.capacity = 4
+        changes = self.clinic.update_date_instances(self.old_occurrences, limit=5, sync_capacity=True)
+        self.assertEqual((changes['created'], changes['deleted']), (0, 0))
+        self.assertEqual(Date.objects.filter(clinic=self.clinic).count(), count)
+        self.assertEqual(Participation.objects.filter(date__in=[moved, last]).count(), 2)
+
+    def test_dates_past_the_old_limit_are_kept(self):
+        """Dates materialized past the 30 occurrences edit_clinic used to cap at"""
+        self.clinic.recurrences = "RRULE:FREQ=DAILY"
+        self.clinic.save()
+        self.clinic.update_date_instances(self.old_occurrences)
+        daily = self.clinic.get_occurrence_datetimes(limit=None)
+        self.assertGreater(len(daily), 30)
+        self.clinic.capacity = 4
+        changes = self.clinic.update_date_instances(daily, sync_capacity=True)
+        self.assertEqual(changes['deleted'], 0)
+        self.assertEqual(Date.objects.filter(clinic=self.clinic, datetime_start__gte=timezone.now()).count(),
+                         len(daily))
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_title_edit_doesnt_reconcile(self):
+        import recurrence
+        staff = Member.objects.create_superuser('staff@gmail.com', 'admin', gender='M')
+        self.client.force_login(staff)
+        Date.objects.filter(clinic=self.clinic).first().delete()
+        count = Date.objects.filter(clinic=self.clinic).count()
+        response = self.client.post(f'/edit_clinic/{self.clinic.id}', {
+            'title': "Renamed", 'recurrences': recurrence.serialize(self.clinic.recurrences),
+            'start_time': self.clinic.start_time, 'end_time': self.clinic.end_time,
+            'capacity': self.clinic.capacity, 'event': self.clinic.event_id, 'is_active': True})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Clinic.objects.get(id=self.clinic.id).title, "Renamed")
+        self.assertEqual(Date.objects.filter(clinic=self.clinic).count(), count)
+
+    def test_dates_are_unique_per_clinic_and_start(self):
+        date = self.clinic.get_fut_dates(1)[0]
+        with self.assertRaises(IntegrityError):
+            Date.objects.create(clinic=self.clinic, datetime_start=date.datetime_start,
+                                datetime_end=date.datetime_end)
+
+    def test_reconciliation_query_count_is_fixed(self):
+        self.clinic.start_time = datetime.time(10, 0)
+        with CaptureQueriesContext(connection) as weekly:
+            self.clinic.update_date_instances(self.old_occurrences)
+        old_occurrences = self.clinic.get_occurrence_datetimes(limit=None)
+        self.clinic.recurrences = "RRULE:FREQ=DAILY"
+        self.clinic.start_time = datetime.time(11, 0)
+        with CaptureQueriesContext(connection) as daily:
+            self.clinic.update_date_instances(old_occurrences)
+        self.assertEqual(len(weekly), len(daily))
+
+
+class TestEligibility(TestCase):
+    def setUp(self):
+        self.mariano = Member.objects.create(
+            email="maj_jalif@gmail.com", first_name="Mariano", last_name="Jalif", gender="M")
+        self.sherine = Member.objects.create(
+            email="sherine.salem@gmail.com", first_name="Sherine", last_name="Salem", gender="F")
+        self.event = Event.objects.create(title="Men's Afternoon Clinic", gender="M")
+        clinic = Clinic.objects.create(
+            event=self.event,
+            recurrences="RRULE:FREQ=WEEKLY;BYDAY=TU",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30)
+        )
+        clinic.update_date_instances()
+        self.dates = list(clinic.get_fut_dates())
+
+    def test_bulk_paths_check_eligibility(self):
+        with self.assertRaises(ValidationError):
+            Participation.objects.bulk_create(
+                [Participation(member=self.mariano, date=self.dates[0]),
+                 Participation(member_id=self.sherine.id, date_id=self.dates[1].id)])
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.dates[0].participants.add(self.sherine)
+        self.assertEqual(Participation.objects.count(), 0)
+        self.dates[0].participants.add(self.mariano)
+        self.assertEqual(Participation.objects.count(), 1)
+
+    def test_event_gender_change_reaches_the_dates(self):
+        self.event.gender = Event.EVENT_MIXED
+        self.event.save()
+        self.assertEqual(set(Date.objects.values_list('eligible_gender', flat=True)), {'MIXED'})
+        Participation.objects.create(member=self.sherine, date=Date.objects.get(id=self.dates[0].id))
+
+    def test_date_saves_take_the_clinic_rule(self):
+        ladies = Clinic.objects.create(
+            event=Event.objects.create(title="Ladies Clinic", gender="F"),
+            recurrences="RRULE:FREQ=WEEKLY;BYDAY=WE",
+            start_time=datetime.time(10, 0),
+            end_time=datetime.time(11, 0))
+        date = Date.objects.create(clinic=self.dates[0].clinic, datetime_start=self.dates[0].datetime_end,
+                                   datetime_end=self.dates[0].datetime_end + datetime.timedelta(hours=1))
+        self.assertFalse(date.is_eligible(self.sherine))
+        date.clinic = ladies
+        date.save(update_fields=['clinic'])
+        self.assertEqual(Date.objects.get(id=date.id).eligible_gender, 'F')
+        with self.assertRaises(ValidationError):
+            Participation.objects.create(member=self.mariano, date=date)
+
+    def test_date_form_checks_the_new_clinic(self):
+        from ..forms import CreateDateForm
+        ladies = Clinic.objects.create(
+            event=Event.objects.create(title="Ladies Clinic", gender="F"),
+            recurrences="RRULE:FREQ=WEEKLY;BYDAY=WE",
+            start_time=datetime.time(10, 0),
+            end_time=datetime.time(11, 0))
+        date = self.dates[0]
+        form = CreateDateForm({
+            'clinic': ladies.id, 'datetime_start': date.datetime_start, 'datetime_end': date.datetime_end,
+            'capacity': 12, 'participants': [self.mariano.id]}, instance=date)
+        self.assertFalse(form.is_valid())
+        self.assertIn("females", str(form.errors))
+
+    def test_single_registration_doesnt_join_the_event(self):
+        date = Date.objects.get(id=self.dates[0].id)
+        with self.assertNumQueries(4):
+            # Savepoint, insert, counter update and release
+            Participation.objects.create(member=self.mariano, date=date)
+
+
+class TestSchedule(TestCase):
+    def setUp(self):
+        self.member = Member.objects.create(email="maj_jalif@gmail.com", gender="M")
+        self.events = [Event.objects.create(title=f"Clinic {i}", gender="MIXED") for i in range(3)]
+        for event in self.events:
+            Clinic.objects.create(
+                event=event,
+                recurrences="RRULE:FREQ=WEEKLY;BYDAY=TU,TH",
+                start_time=datetime.time(8, 30),
+                end_time=datetime.time(9, 30)
+            ).update_date_instances(limit=4)
+        for event in self.events[:2]:
+            for date in event.get_fut_dates(3):
+                Participation.objects.create(member=self.member, date=date)
+
+    def test_schedule_is_one_query_per_request(self):
+        member = Member.objects.get(id=self.member.id)
+        with self.assertNumQueries(1):
+            schedule = member.get_schedule()
+            events = member.get_schedule_events()
+            [part.date.clinic.event.title for part in schedule]
+            member.get_schedule()
+        self.assertEqual(len(schedule), 6)
+        self.assertCountEqual(events, self.events[:2])
+        starts = [part.date.datetime_start for part in schedule]
+        self.assertEqual(starts, sorted(starts))
+
+    def test_registrations_clear_the_schedule(self):
+        from ..registrations import update_registrations
+        self.assertEqual(len(self.member.get_schedule()), 6)
+        update_registrations(self.member, self.events[2], [self.events[2].get_fut_dates(1)[0].id])
+        self.assertEqual(len(self.member.get_schedule()), 7)
+        self.assertCountEqual(self.member.get_schedule_events(), self.events)
+
+
+class TestDateDetails(TestCase):
+    def setUp(self):
+        self.members = [Member.objects.create(email=f"member{i}@gmail.com", gender="M") for i in range(4)]
+        self.event = Event.objects.create(title="Men's Clinic", gender="M")
+        Clinic.objects.create(
+            event=self.event,
+            recurrences="RRULE:FREQ=DAILY",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30),
+            capacity=2
+        ).update_date_instances(limit=5)
+        self.dates = list(self.event.get_fut_dates(3))
+        registered = timezone.now() - datetime.timedelta(days=1)
+        Participation.objects.bulk_create([
+            Participation(member=member, date=self.dates[0], date_registered=registered + datetime.timedelta(minutes=i))
+            for i, member in enumerate(self.members)])
+        Participation.objects.create(member=self.members[3], date=self.dates[1])
+
+    def test_details_match_the_per_date_methods(self):
+        member = self.members[3]
+        with self.assertNumQueries(1):
+            dates = self.event.get_date_details(member, 3)
+            details = [(date.registered, date.registrable, date.rem_spots, date.waitlist_rank) for date in dates]
+        self.assertEqual(dates, self.dates)
+        self.assertEqual([registrable for _, registrable, _, _ in details],
+                         [date.is_registrable() for date in self.dates])
+        self.assertEqual([(registered, rem_spots, rank) for registered, _, rem_spots, rank in details],
+                         [(True, -2, 2), (True, 1, None), (False, 2, None)])
+
+    def test_waitlist_rank_follows_the_deletes(self):
+        Participation.objects.filter(member=self.members[1], date=self.dates[0]).delete()
+        date = self.event.get_date_details(self.members[3], 1)[0]
+        self.assertEqual((date.rem_spots, date.waitlist_rank), (-1, 1))
+        date = self.event.get_date_details(self.members[2], 1)[0]
+        self.assertEqual((date.registered, date.waitlist_rank), (True, None))
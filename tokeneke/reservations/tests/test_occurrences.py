@@ -0,0 +1,55 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from recurrence.base import Recurrence
+from ..occurrences import get_occurrences, _expand
+import recurrence
+import datetime
+
+
+class TestGetOccurrences(TestCase):
+    def setUp(self):
+        _expand.cache_clear()
+        cache.clear()
+        self.rule = recurrence.deserialize("RRULE:FREQ=WEEKLY;BYDAY=TU")
+        self.args = (datetime.time(8, 30), datetime.time(9, 30),
+                     datetime.date(2023, 3, 1), datetime.date(2023, 4, 1))
+
+    def expand(self, rule=None, *args):
+        with mock.patch.object(Recurrence, 'between', autospec=True,
+                               side_effect=Recurrence.between) as between:
+            occurrences = get_occurrences(rule or self.rule, *(args or self.args))
+        return occurrences, between.call_count
+
+    def test_expands_the_window(self):
+        occurrences, _ = self.expand()
+        self.assertEqual(occurrences[0], (datetime.datetime(2023, 3, 7, 8, 30),
+                                          datetime.datetime(2023, 3, 7, 9, 30)))
+        self.assertEqual(len(occurrences), 4)
+
+    def test_rule_dtstart_is_kept(self):
+        occurrences, _ = self.expand(recurrence.deserialize(
+            "DTSTART:20230315T000000\nRRULE:FREQ=WEEKLY;BYDAY=TU"))
+        self.assertEqual([start.date() for start, _ in occurrences],
+                         [datetime.date(2023, 3, 21), datetime.date(2023, 3, 28)])
+        # An earlier DTSTART doesn't move the window
+        occurrences, _ = self.expand(recurrence.deserialize(
+            "DTSTART:20220101T000000\nRRULE:FREQ=WEEKLY;BYDAY=TU"))
+        self.assertEqual(len(occurrences), 4)
+
+    def test_local_and_shared_tiers(self):
+        occurrences, calls = self.expand()
+        self.assertEqual(calls, 1)
+        self.assertEqual(self.expand(), (occurrences, 0))
+        # Another process only has the shared cache
+        _expand.cache_clear()
+        self.assertEqual(self.expand(), (occurrences, 0))
+
+    def test_rule_times_and_window_are_part_of_the_key(self):
+        self.expand()
+        _, calls = self.expand(recurrence.deserialize("RRULE:FREQ=WEEKLY;BYDAY=WE"))
+        self.assertEqual(calls, 1)
+        _, calls = self.expand(self.rule, datetime.time(10, 0), *self.args[1:])
+        self.assertEqual(calls, 1)
+        _, calls = self.expand(self.rule, *self.args[:3], datetime.date(2023, 5, 1))
+        self.assertEqual(calls, 1)
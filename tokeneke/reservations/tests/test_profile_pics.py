@@ -0,0 +1,129 @@
+from io import BytesIO, StringIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from ..models import *
+from ..profile_pics import VARIANTS, get_variant_name
+import tempfile
+
+
+def make_picture(color='red', size=(800, 600)):
+    # Returns the bytes of a JPEG with EXIF data, rotated by its orientation
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010F] = "Camera maker"
+    output = BytesIO()
+    Image.new('RGB', size, color).save(output, 'JPEG', exif=exif)
+    return output.getvalue()
+
+
+class MediaRootMixin:
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name, ALLOWED_HOSTS=['testserver'])
+        settings.enable()
+        self.addCleanup(settings.disable)
+        super().setUp()
+
+
+class TestProfilePics(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = Member.objects.create_user("maj_jalif@gmail.com", "mariano", gender="M")
+        self.client.force_login(self.member)
+
+    def upload(self, data):
+        return self.client.post('/edit_profile', {
+            'first_name': "Mariano", 'last_name': "Jalif", 'email': self.member.email,
+            'profile_pic': SimpleUploadedFile('me.jpg', data, content_type='image/jpeg')})
+
+    def test_upload_creates_the_variants(self):
+        response = self.upload(make_picture())
+        self.assertEqual(response.status_code, 302)
+        self.member.refresh_from_db()
+        self.assertEqual(len(self.member.profile_pic_hash), 16)
+        for variant, size in VARIANTS.items():
+            for extension, image_format in [('webp', 'WEBP'), ('jpg', 'JPEG')]:
+                with default_storage.open(get_variant_name(self.member.profile_pic_hash, variant, extension)) as variant_file:
+                    image = Image.open(variant_file)
+                    self.assertEqual((image.format, image.size), (image_format, (size, size)))
+                    self.assertEqual(dict(image.getexif()), {})
+
+    def test_same_picture_same_variants(self):
+        self.upload(make_picture())
+        self.member.refresh_from_db()
+        first_hash = self.member.profile_pic_hash
+        self.upload(make_picture())
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.profile_pic_hash, first_hash)
+        self.upload(make_picture('blue'))
+        self.member.refresh_from_db()
+        self.assertNotEqual(self.member.profile_pic_hash, first_hash)
+
+    def test_template_tag_picks_the_variant(self):
+        response = self.client.get('/edit_profile')
+        self.assertContains(response, f'<img src="{self.member.profile_pic.url}"')
+        self.upload(make_picture())
+        self.member.refresh_from_db()
+        response = self.client.get('/edit_profile')
+        self.assertContains(response, 'srcset="/static/media/%s" type="image/webp"' % get_variant_name(
+            self.member.profile_pic_hash, 'avatar', 'webp'))
+        self.assertContains(response, 'id="photo"')
+
+    def test_any_save_of_a_new_picture_creates_the_variants(self):
+        """The admin and any other code saving the Member, not only the views"""
+        self.member.profile_pic = SimpleUploadedFile('me.jpg', make_picture(), content_type='image/jpeg')
+        self.member.save()
+        pic_hash = Member.objects.get(id=self.member.id).profile_pic_hash
+        self.assertTrue(default_storage.exists(get_variant_name(pic_hash, 'thumb', 'webp')))
+
+        member = Member.objects.get(id=self.member.id)
+        member.first_name = "Mariano"
+        member.save()
+        member.save(update_fields=['last_login'])
+        self.assertEqual(Member.objects.get(id=self.member.id).profile_pic_hash, pic_hash)
+
+        # Another stored picture is left to backfill_profile_pics
+        member.profile_pic = 'profile_pics/other.jpg'
+        member.save()
+        self.assertEqual(Member.objects.get(id=self.member.id).profile_pic_hash, '')
+
+    def test_editing_the_profile_keeps_the_picture(self):
+        self.upload(make_picture())
+        pic_hash = Member.objects.get(id=self.member.id).profile_pic_hash
+        self.client.post('/edit_profile', {
+            'first_name': "Tom", 'last_name': "Jalif", 'email': self.member.email})
+        self.assertEqual(Member.objects.get(id=self.member.id).profile_pic_hash, pic_hash)
+
+    def test_register_with_a_picture(self):
+        self.client.logout()
+        response = self.client.post('/register', {
+            'email': "tom@gmail.com", 'first_name': "Tom", 'last_name': "Smith", 'member_n': "12",
+            'password1': "a-Long-passw0rd", 'password2': "a-Long-passw0rd",
+            'profile_pic': SimpleUploadedFile('me.jpg', make_picture(), content_type='image/jpeg')})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(Member.objects.get(email="tom@gmail.com").profile_pic_hash), 16)
+
+
+class TestBackfillProfilePics(MediaRootMixin, TransactionTestCase):
+    """A TransactionTestCase, since the workers need the connections closed"""
+
+    def test_backfills_every_picture_once(self):
+        default_storage.save('profile_pics/default.jpeg', ContentFile(make_picture('gray')))
+        members = [Member.objects.create_user(f"member{i}@gmail.com", "pass", gender="M") for i in range(3)]
+        members[0].profile_pic.save('mine.jpg', ContentFile(make_picture()))
+        missing = Member.objects.create_user("missing@gmail.com", "pass", gender="M",
+                                             profile_pic='profile_pics/missing.jpg')
+        call_command('backfill_profile_pics', workers=2, stdout=StringIO(), stderr=StringIO())
+        hashes = [member.profile_pic_hash for member in Member.objects.filter(
+            id__in=[member.id for member in members]).order_by('id')]
+        self.assertNotEqual(hashes[0], hashes[1])
+        self.assertEqual(hashes[1], hashes[2])
+        self.assertTrue(all(default_storage.exists(get_variant_name(pic_hash, 'thumb', 'webp'))
+                            for pic_hash in hashes))
+        missing.refresh_from_db()
+        self.assertEqual(missing.profile_pic_hash, '')
@@ -0,0 +1,134 @@
+"""
+Query-count budgets: every view is rendered over a small and a large seeded
+club and must run the same number of SQL queries for both, so a view that
+goes N+1 fails with a diff of its extra queries.
+"""
+from datetime import timedelta
+import difflib
+import json
+import re
+import tempfile
+
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from .. import urls
+from ..feeds import get_member_feed_token
+from ..models import *
+from ..seed import seed_club
+
+SMALL_CLUB = {'members': 20, 'events': 4, 'clinics_per_event': 1}
+# Added on top of the small club. More clinics per event make the latest
+# event, clinic and dates bigger too, not only the lists of events.
+LARGE_CLUB = {'members': 80, 'events': 16, 'clinics_per_event': 3}
+
+
+def normalize(sql):
+    # Replaces the literals, so the same query with other ids compares equal
+    sql = re.sub(r"'(?:[^']|'')*'", "'?'", sql)
+    # Numbers in cursor and savepoint names too
+    sql = re.sub(r'\d+(\.\d+)?', '?', sql)
+    return re.sub(r'IN \([?, ]+\)', 'IN (...)', sql)
+
+
+def get_cases():
+    """
+    Returns {url name: (user, method, url, data)} for every view, with the
+    biggest objects of the club, so the large club gets bigger pages.
+    """
+    now = timezone.now()
+    staff = Member.objects.get(email='staff@tokeneke.test')
+    member = Member.objects.filter(is_staff=False).annotate(
+        parts=Count('participation')).order_by('-parts', 'id').first()
+    event = Event.objects.filter(
+        clinic__date__participation__member=member,
+        clinic__date__datetime_start__gte=now).annotate(
+        clinics=Count('clinic', distinct=True)).order_by('-clinics', '-id').first()
+    clinic = event.get_clinics().last()
+    date = Date.objects.filter(datetime_start__gte=now).annotate(
+        parts=Count('participation')).order_by('-parts', '-id').first()
+    # Registers for other dates than the member's, so some are created and some deleted
+    other_dates = Date.objects.filter(clinic__event=event, datetime_start__gte=now).exclude(
+        participation__member=member).order_by('datetime_start')
+    date_ids = [date.id for date in other_dates if date.is_registrable()][:4]
+    return {
+        'home': (member, 'get', reverse('home'), None),
+        'register': (None, 'get', reverse('register'), None),
+        'login': (None, 'get', reverse('login'), None),
+        'logout': (member, 'get', reverse('logout'), None),
+        'edit_all_events': (staff, 'get', reverse('edit_all_events'), None),
+        'reset_password': (None, 'get', reverse('reset_password'), None),
+        'password_reset_done': (None, 'get', reverse('password_reset_done'), None),
+        'password_reset_confirm': (None, 'get', reverse(
+            'password_reset_confirm', args=['MQ', 'set-password']), None),
+        'password_reset_complete': (None, 'get', reverse('password_reset_complete'), None),
+        'create_event': (staff, 'get', reverse('create_event'), None),
+        'create_clinic': (staff, 'get', reverse('create_clinic'), None),
+        'edit_profile': (member, 'get', reverse('edit_profile'), None),
+        'edit_event': (staff, 'get', reverse('edit_event', args=[event.id]), None),
+        'edit_clinic': (staff, 'get', reverse('edit_clinic', args=[clinic.id]), None),
+        'filter_events': (member, 'post', reverse('filter_events'), {
+            'input': 'e', 'curr_events': json.dumps(list(Event.objects.values_list('title', flat=True)))}),
+        'edit_date': (staff, 'get', reverse('edit_date', args=[date.id]), None),
+        'event': (member, 'get', reverse('event', args=[event.id]), None),
+        'event_participants': (member, 'get', reverse('event_participants', args=[event.id]), None),
+        'add_participant': (member, 'post', reverse('add_participant'), {
+            'event_id': event.id, 'dates': json.dumps(date_ids)}),
+        'my_events': (member, 'get', reverse('my_events'), None),
+        'calendar': (member, 'get', reverse('calendar'), None),
+        'calendar_feed': (member, 'get', reverse('calendar_feed'), {
+            'start': now.isoformat(), 'end': (now + timedelta(days=31)).isoformat()}),
+        'metrics': (staff, 'get', reverse('metrics'), None),
+        'member_feed': (None, 'get', reverse('member_feed', args=[get_member_feed_token(member)]), None),
+        'event_feed': (None, 'get', reverse('event_feed', args=[event.id]), None),
+    }
+
+
+class TestQueryBudgets(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(ALLOWED_HOSTS=['testserver'], METRICS_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        Member.objects.create_superuser('staff@tokeneke.test', 'admin', gender='M')
+
+    def capture(self):
+        # Returns {url name: (status code, [queries])} for every view
+        captured = {}
+        for name, (user, method, url, data) in get_cases().items():
+            self.client.logout()
+            if user:
+                self.client.force_login(user)
+            with CaptureQueriesContext(connection) as ctx:
+                response = getattr(self.client, method)(url, data or {})
+                if response.streaming:
+                    # The queries of streamed responses run while they are read
+                    b''.join(response.streaming_content)
+            captured[name] = (response.status_code, [normalize(query['sql']) for query in ctx])
+        return captured
+
+    def test_every_view_has_a_budget(self):
+        seed_club(**SMALL_CLUB)
+        names = {pattern.name for pattern in urls.urlpatterns
+                 if isinstance(pattern, URLPattern) and pattern.name}
+        self.assertTrue(names)
+        self.assertEqual(names - set(get_cases()), set())
+
+    def test_queries_do_not_grow_with_the_club(self):
+        seed_club(**SMALL_CLUB)
+        small = self.capture()
+        seed_club(seed=1, **LARGE_CLUB)
+        large = self.capture()
+        for name, (status, queries) in large.items():
+            with self.subTest(view=name):
+                self.assertLess(status, 400)
+                small_queries = small[name][1]
+                if len(queries) > len(small_queries):
+                    self.fail(f'{name} ran {len(queries)} queries over the large club and '
+                              f'{len(small_queries)} over the small one:\n' + '\n'.join(
+                                  difflib.unified_diff(small_queries, queries, 'small', 'large', lineterm='')))
@@ -0,0 +1,95 @@
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from ..models import *
+from ..views import get_available_events
+import datetime
+import random
+
+WORDS = ["Morning", "Afternoon", "Evening", "Ladies", "Men's", "Mixed", "Drill",
+         "Clinic", "Doubles", "Singles", "Cardio", "Junior", "Advanced", "Social"]
+
+
+class TestQueryPlans(TestCase):
+    """
+    Seeds a club sized database and checks with EXPLAIN that the hot lookups
+    use index scans instead of scanning the dates and participations tables.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rand = random.Random(42)
+        cls.members = Member.objects.bulk_create([
+            Member(email=f"member{i}@gmail.com", first_name="Member", last_name=str(i),
+                   gender=rand.choice("MF")) for i in range(300)])
+        events = Event.objects.bulk_create([
+            Event(title=" ".join(rand.sample(WORDS, 3)) + f" {i}", gender="MIXED")
+            for i in range(2000)])
+        clinics = Clinic.objects.bulk_create([
+            Clinic(event=event, recurrences="RRULE:FREQ=WEEKLY",
+                   start_time=datetime.time(8, 30), end_time=datetime.time(9, 30))
+            for event in events])
+
+        # Two years of history and half a year of future dates for the first clinics
+        first_start = timezone.now() - datetime.timedelta(weeks=104)
+        dates = Date.objects.bulk_create([
+            Date(clinic=clinic, datetime_start=first_start + datetime.timedelta(weeks=week),
+                 datetime_end=first_start + datetime.timedelta(weeks=week, hours=1),
+                 eligible_gender=Event.EVENT_MIXED)
+            for clinic in clinics[:150] for week in range(130)], batch_size=5000)
+        Participation.objects.bulk_create([
+            Participation(member=member, date=date)
+            for date in dates for member in rand.sample(cls.members, 4)], batch_size=5000)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cls.event = events[0]
+        cls.date = dates[-1]
+
+    def get_plans(self, func):
+        # Runs func and returns the EXPLAIN output of every query it executed
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        plans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                cursor.execute("EXPLAIN " + query['sql'])
+                plans.append("\n".join(row[0] for row in cursor.fetchall()))
+        return plans
+
+    def assertUsesIndexes(self, func, tables=("reservations_date", "reservations_participation")):
+        plans = self.get_plans(func)
+        self.assertTrue(plans)
+        for plan in plans:
+            for table in tables:
+                self.assertNotIn(f"Seq Scan on {table}", plan)
+
+    def test_get_fut_dates(self):
+        self.assertUsesIndexes(lambda: list(self.event.get_fut_dates()))
+
+    def test_get_all_parts(self):
+        self.assertUsesIndexes(lambda: self.date.get_all_parts())
+
+    def test_get_fut_participations_registered(self):
+        member = self.members[0]
+        self.assertUsesIndexes(lambda: list(member.get_fut_participations_registered()))
+
+    def test_calendar_window(self):
+        start = timezone.now()
+        self.assertUsesIndexes(lambda: list(Date.objects.for_calendar(
+            self.members[0], start, start + datetime.timedelta(days=31))))
+
+    def test_get_available_events(self):
+        request = RequestFactory().get('/')
+        request.user = self.members[0]
+        self.assertUsesIndexes(lambda: list(get_available_events(request)))
+
+    def test_title_search(self):
+        # A club's events table stays small enough for a sequential scan to be the
+        # cheapest plan, so this only checks that the trigram index can serve the
+        # UPPER(title) LIKE expression icontains generates.
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plans = self.get_plans(lambda: list(Event.objects.filter(title__icontains="Cardio Drill")))
+        self.assertIn("event_title_trgm_idx", plans[0])
@@ -0,0 +1,61 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.exceptions import ValidationError
+from ..models import *
+from ..registrations import update_registrations
+import datetime
+
+
+class TestUpdateRegistrations(TestCase):
+    def setUp(self):
+        self.mariano = Member.objects.create(
+            email="maj_jalif@gmail.com", first_name="Mariano", last_name="Jalif", gender="M")
+        self.sherine = Member.objects.create(
+            email="sherine.salem@gmail.com", first_name="Sherine", last_name="Salem", gender="F")
+        self.event = Event.objects.create(title="Men's Morning Clinic", gender="M")
+        clinic = Clinic.objects.create(
+            event=self.event,
+            title="Clinic for Men's Morning",
+            recurrences="RRULE:FREQ=DAILY",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30)
+        )
+        clinic.update_date_instances()
+        self.date_ids = list(clinic.get_fut_dates().values_list('id', flat=True))
+
+    def get_registered_ids(self, member):
+        return set(Participation.objects.filter(member=member).values_list('date_id', flat=True))
+
+    def test_selection_is_applied_as_a_diff(self):
+        """Only the added dates are created and only the removed ones deleted"""
+        self.assertEqual(update_registrations(self.mariano, self.event, self.date_ids[:3]), (3, 0))
+        self.assertEqual(update_registrations(self.mariano, self.event, self.date_ids[1:5]), (2, 1))
+        self.assertEqual(self.get_registered_ids(self.mariano), set(self.date_ids[1:5]))
+        self.assertEqual(update_registrations(self.mariano, self.event, []), (0, 4))
+        self.assertEqual(self.get_registered_ids(self.mariano), set())
+
+    def test_dates_of_other_events_are_ignored(self):
+        other_event = Event.objects.create(title="Mixed Clinic", gender="MIXED")
+        other_clinic = Clinic.objects.create(
+            event=other_event,
+            recurrences="RRULE:FREQ=WEEKLY;BYDAY=TU",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30)
+        )
+        other_clinic.update_date_instances()
+        other_date = other_clinic.get_fut_dates(1)[0]
+        self.assertEqual(update_registrations(self.mariano, self.event, [other_date.id]), (0, 0))
+
+    def test_ineligible_member_cant_register(self):
+        with self.assertRaises(ValidationError):
+            update_registrations(self.sherine, self.event, self.date_ids[:1])
+        self.assertEqual(self.get_registered_ids(self.sherine), set())
+
+    def test_query_count_doesnt_depend_on_selection_size(self):
+        update_registrations(self.mariano, self.event, self.date_ids[:1])
+        with CaptureQueriesContext(connection) as few:
+            update_registrations(self.mariano, self.event, self.date_ids[1:3])
+        with CaptureQueriesContext(connection) as many:
+            update_registrations(self.mariano, self.event, self.date_ids[3:])
+        self.assertEqual(len(few), len(many))
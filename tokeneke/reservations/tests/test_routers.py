@@ -0,0 +1,77 @@
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from ..models import *
+from ..routers import ReplicaRouter, _read_database
+import datetime
+import json
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], REPLICA_DATABASES=['replica0'], CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test_routers'}})
+class TestReplicaRouter(TransactionTestCase):
+    """
+    replica0 is a second connection to the test database, so it only sees
+    committed data and the tests commit theirs.
+    """
+    databases = {'default', 'replica0'}
+
+    def setUp(self):
+        self.member = Member.objects.create_user("maj_jalif@gmail.com", "mariano", gender="M")
+        self.event = Event.objects.create(title="Men's Clinic", gender="M")
+        Clinic.objects.create(
+            event=self.event,
+            recurrences="RRULE:FREQ=DAILY",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30),
+            capacity=4
+        ).update_date_instances(limit=5)
+        self.dates = list(self.event.get_fut_dates(5))
+        self.client.force_login(self.member)
+
+    def get_event(self):
+        # Returns the event page and the queries it ran on the replica
+        with CaptureQueriesContext(connections['replica0']) as ctx:
+            response = self.client.get(f'/event/{self.event.id}')
+        self.assertEqual(response.status_code, 200)
+        return response, ctx.captured_queries
+
+    def test_reads_go_to_the_replica(self):
+        response, queries = self.get_event()
+        self.assertTrue(any('reservations_date' in query['sql'] for query in queries))
+        self.assertContains(response, "Men&#x27;s Clinic")
+
+    def test_writes_go_to_the_primary(self):
+        token = _read_database.set('replica0')
+        try:
+            self.assertEqual(ReplicaRouter().db_for_read(Date), 'replica0')
+            self.assertEqual(ReplicaRouter().db_for_write(Date), 'default')
+        finally:
+            _read_database.reset(token)
+
+    def test_sticks_to_the_primary_after_registering(self):
+        response = self.client.post('/add_participant', {
+            'event_id': self.event.id, 'dates': json.dumps([self.dates[0].id])})
+        self.assertEqual(response.status_code, 200)
+        response, queries = self.get_event()
+        self.assertEqual(queries, [])
+        self.assertEqual([date for date in response.context['dates'] if date.registered], [self.dates[0]])
+
+    def test_sticks_to_the_primary_after_editing_the_profile(self):
+        response = self.client.post('/edit_profile', {
+            'first_name': "Mariano", 'last_name': "Jalif", 'email': self.member.email, 'member_n': 1})
+        self.assertEqual(response.status_code, 302)
+        response, queries = self.get_event()
+        self.assertEqual(queries, [])
+
+    @override_settings(REPLICA_STICKY_SECONDS=0)
+    def test_stickiness_expires(self):
+        self.client.post('/add_participant', {
+            'event_id': self.event.id, 'dates': json.dumps([self.dates[0].id])})
+        response, queries = self.get_event()
+        self.assertNotEqual(queries, [])
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_no_replicas(self):
+        response, queries = self.get_event()
+        self.assertEqual(queries, [])
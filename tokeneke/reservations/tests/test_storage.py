@@ -0,0 +1,52 @@
+from io import StringIO
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from ..storage import brotli
+import gzip
+import os
+import tempfile
+import unittest
+
+
+class TestCompressedManifestStaticFilesStorage(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Collected once, brotli's best compression is slow
+        static_root = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(static_root.cleanup)
+        cls.static_root = static_root.name
+        generated = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(generated.cleanup)
+        settings = override_settings(
+            STATIC_ROOT=cls.static_root, GENERATED_STATIC_DIR=generated.name, STATICFILES_DIRS=[generated.name],
+            STATICFILES_STORAGE='reservations.storage.CompressedManifestStaticFilesStorage')
+        settings.enable()
+        cls.addClassCleanup(settings.disable)
+        call_command('build_jsi18n', stdout=StringIO())
+        call_command('collectstatic', interactive=False, verbosity=0, stdout=StringIO())
+
+    def read(self, name):
+        with open(os.path.join(self.static_root, name), 'rb') as static_file:
+            return static_file.read()
+
+    def test_hashed_and_compressed(self):
+        name = staticfiles_storage.stored_name('css/home.css')
+        self.assertRegex(name, r'^css/home\.[0-9a-f]{12}\.css$')
+        self.assertEqual(gzip.decompress(self.read(name + '.gz')), self.read(name))
+        self.assertEqual(gzip.decompress(self.read('css/home.css.gz')), self.read('css/home.css'))
+
+    @unittest.skipUnless(brotli, "Brotli isn't installed")
+    def test_brotli(self):
+        name = staticfiles_storage.stored_name('css/home.css')
+        self.assertEqual(brotli.decompress(self.read(name + '.br')), self.read(name))
+
+    def test_images_arent_compressed(self):
+        name = staticfiles_storage.stored_name('recurrence/img/recurrence-calendar-icon.png')
+        self.assertTrue(os.path.exists(os.path.join(self.static_root, name)))
+        self.assertFalse(os.path.exists(os.path.join(self.static_root, name + '.gz')))
+
+    def test_jsi18n_catalog_is_collected(self):
+        name = staticfiles_storage.stored_name('jsi18n.js')
+        self.assertIn(b'django.gettext', self.read(name))
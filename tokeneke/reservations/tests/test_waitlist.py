@@ -0,0 +1,101 @@
+from django.core import mail
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from ..models import *
+from ..registrations import update_registrations
+import datetime
+import threading
+
+
+class WaitlistMixin:
+    def setUp(self):
+        self.event = Event.objects.create(title="Men's Clinic", gender="M")
+        clinic = Clinic.objects.create(
+            event=self.event,
+            recurrences="RRULE:FREQ=DAILY",
+            start_time=datetime.time(8, 30),
+            end_time=datetime.time(9, 30),
+            capacity=2
+        )
+        clinic.update_date_instances(limit=5)
+        self.dates = list(clinic.get_fut_dates(2))
+        self.members = [Member.objects.create_user(f"member{i}@gmail.com", "pass", first_name=f"Player{i}",
+                                                   gender="M") for i in range(6)]
+        # Registered in order, the first two on court and the others waiting
+        registered = timezone.now() - datetime.timedelta(days=1)
+        Participation.objects.bulk_create([
+            Participation(member=member, date=date, date_registered=registered + datetime.timedelta(minutes=i))
+            for date in self.dates for i, member in enumerate(self.members)])
+
+    def get_notified(self):
+        return [message.to[0] for message in mail.outbox]
+
+
+class TestWaitlistPromotion(WaitlistMixin, TestCase):
+    def test_unregistering_from_court_promotes_the_next(self):
+        update_registrations(self.members[0], self.event, [self.dates[1].id])
+        self.assertEqual(self.get_notified(), [self.members[2].email])
+        self.assertIn(self.event.title, mail.outbox[0].body)
+        self.assertEqual(self.dates[0].get_all_parts()[:2], [self.members[1], self.members[2]])
+
+    def test_unregistering_from_the_waitlist_promotes_nobody(self):
+        Participation.objects.get(member=self.members[3], date=self.dates[0]).delete()
+        self.assertEqual(mail.outbox, [])
+
+    def test_bulk_delete(self):
+        Participation.objects.filter(date=self.dates[0], member__in=[
+            self.members[0], self.members[1], self.members[3]]).delete()
+        self.assertEqual(sorted(self.get_notified()), [self.members[2].email, self.members[4].email])
+
+    def test_one_mail_per_member(self):
+        Participation.objects.filter(member__in=self.members[:2]).delete()
+        self.assertEqual(sorted(self.get_notified()), [self.members[2].email, self.members[3].email])
+        self.assertEqual(mail.outbox[0].body.count(self.event.title), 2)
+
+    def test_deleting_a_member_promotes_the_next(self):
+        self.members[1].delete()
+        self.assertEqual(self.get_notified(), [self.members[2].email])
+
+    def test_ties_follow_the_court_order(self):
+        Participation.objects.filter(date=self.dates[0]).update(date_registered=timezone.now())
+        waiting = self.dates[0].get_parts_on_wait()
+        Participation.objects.filter(date=self.dates[0], member=self.members[0]).delete()
+        self.assertEqual(self.get_notified(), [waiting[0].email])
+        self.assertEqual(self.event.get_date_details(waiting[1], 1)[0].waitlist_rank, 1)
+
+    def test_past_dates_promote_nobody(self):
+        Date.objects.filter(id=self.dates[0].id).update(
+            datetime_start=timezone.now() - datetime.timedelta(days=1))
+        Participation.objects.filter(date=self.dates[0], member=self.members[0]).delete()
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(EMAIL_BACKEND='reservations.mail.OutboxEmailBackend')
+    def test_notifications_are_one_insert(self):
+        with CaptureQueriesContext(connection) as ctx:
+            Participation.objects.filter(member__in=self.members[:2]).delete()
+        inserts = [query['sql'] for query in ctx if 'INSERT INTO "reservations_outgoingmail"' in query['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(OutgoingMail.objects.count(), 2)
+
+
+class TestConcurrentPromotions(WaitlistMixin, TransactionTestCase):
+    """A TransactionTestCase, since the deletes run in two connections"""
+
+    def test_concurrent_deletes_promote_different_members(self):
+        def delete_second():
+            try:
+                Participation.objects.get(member=self.members[1], date=self.dates[0]).delete()
+            finally:
+                connection.close()
+
+        other = threading.Thread(target=delete_second)
+        with transaction.atomic():
+            Participation.objects.get(member=self.members[0], date=self.dates[0]).delete()
+            other.start()
+            # It waits for the lock on the Date
+            other.join(timeout=1)
+            self.assertTrue(other.is_alive())
+        other.join()
+        self.assertEqual(sorted(self.get_notified()), [self.members[2].email, self.members[3].email])
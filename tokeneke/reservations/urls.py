@@ -1,13 +1,14 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import async_views, views
 from django.conf import settings
 from django.conf.urls.static import static
 
-from django.views.i18n import JavaScriptCatalog
+# Under ASGI the read views are async, so a slow query doesn't hold a worker
+read_views = async_views if settings.SERVER_MODE == 'asgi' else views
 
 urlpatterns = [
-    path('', views.home, name='home'),
+    path('', read_views.home, name='home'),
     path('register', views.register, name='register'),
     path('login', views.login_user, name='login'),
     path('logout', views.logout_user, name='logout'),
@@ -25,20 +26,21 @@ urlpatterns = [
     path('edit_profile', views.edit_profile, name='edit_profile'),
     path('edit_event/<int:event_id>', views.edit_event, name='edit_event'),
     path('edit_clinic/<int:clinic_id>', views.edit_clinic, name='edit_clinic'),
-    path('filter_events', views.filter_events, name='filter_events'),
+    path('filter_events', read_views.filter_events, name='filter_events'),
     path('edit_date/<int:date_id>', views.edit_date, name='edit_date'),
-    path('event/<int:event_id>', views.event, name='event'),
+    path('event/<int:event_id>', read_views.event, name='event'),
     path('event/<int:event_id>/participants',
          views.event_participants, name='event_participants'),
     path('add_participant', views.add_participant, name='add_participant'),
     path('my_events', views.my_events, name='my_events'),
-    path('calendar', views.calendar, name='calendar')
+    path('calendar', views.calendar, name='calendar'),
+    path('calendar/feed', read_views.calendar_feed, name='calendar_feed'),
+    path('metrics', views.metrics, name='metrics'),
+    path('feeds/member/<str:token>.ics', views.member_feed, name='member_feed'),
+    path('feeds/event/<int:event_id>.ics', views.event_feed, name='event_feed'),
 
 ]
 
-urlpatterns += [path('jsi18n.js',
-                     JavaScriptCatalog.as_view(packages=['recurrence']), name='jsi18n'), ]
-
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL,
                           document_root=settings.MEDIA_ROOT)
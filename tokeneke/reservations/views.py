@@ -4,23 +4,40 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponseBadRequest
+from django.http import Http404, HttpResponseBadRequest
 from django.http import JsonResponse
-from .models import Event, Clinic, Date, Participation, Member
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from .models import Event, Clinic, Date, Member
+from .registrations import update_registrations
+from .cards import add_cards
+from .routers import read_from_replica, stick_to_primary
+from .feeds import get_event_feed_etag, get_feed_member_id, get_member_feed_token, get_schedule_updated, iter_calendar
+from .feeds import CALENDAR_MAX_DAYS, get_calendar_dates
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
+from .metrics import collect, render_prometheus
+from django.core.exceptions import ValidationError
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 import json
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from .constants import *
+from django.views.decorators.http import condition
+from django.urls import reverse
 
 
 def get_available_events(request):
-    request.user.get_fut_events_registered()
     excl_gen = 'F' if request.user.gender == 'M' else 'M'
-    return Event.objects.filter(clinic__date__datetime_start__gte=timezone.now()).exclude(gender=excl_gen).distinct()
+    # EXISTS probes the (clinic, datetime_start) index per event, instead of
+    # joining every future date and removing the duplicates.
+    fut_dates = Date.objects.filter(
+        clinic__event=OuterRef('pk'), datetime_start__gte=timezone.now())
+    return Event.objects.filter(Exists(fut_dates)).exclude(gender=excl_gen)
 
 
 @login_required
+@read_from_replica
 def filter_events(request):
     if request.method == "POST":
         string = request.POST.get('input')
@@ -32,35 +49,37 @@ def filter_events(request):
 
 
 @login_required
+@read_from_replica
 def home(request):
     # Querying all the events that have a next date after today. The next date field takes
     # care of giving the next date based on todays date.
-    events = get_available_events(request)
+    events = add_cards(get_available_events(request).with_next_date(), request.user)
     return render(request, 'main/home.html', {
         'events': events,
         'page_title': 'Events Available',
         'titles': {
-            'Registered Dates': request.user.get_fut_participations_registered().count(),
-            'Registered Events': request.user.get_fut_events_registered().count(),
-            'Events Available': events.count()
+            'Registered Dates': len(request.user.get_schedule()),
+            'Registered Events': len(request.user.get_schedule_events()),
+            'Events Available': len(events)
         }
     })
 
 
 @login_required
+@read_from_replica
 def my_events(request):
-    user_events = request.user.get_fut_events_registered()
-    try:
-        next_event = request.user.get_fut_participations_registered()[0]
-    except:
-        next_event = None
+    user_events = add_cards(request.user.get_fut_events_registered().with_next_date(), request.user)
+    # Returns the first participation on the schedule, if empty then it returns None
+    next_event = next(iter(request.user.get_schedule()), None)
     return render(request, 'main/home.html', {
         'page_title': 'My Events',
         'events': user_events,
         'next_event': next_event,
+        'feed_url': request.build_absolute_uri(
+            reverse('member_feed', args=[get_member_feed_token(request.user)])),
         'titles': {
-            'Registered Dates': request.user.get_fut_participations_registered().count(),
-            'Registered Events': user_events.count(),
+            'Registered Dates': len(request.user.get_schedule()),
+            'Registered Events': len(user_events),
         }
     })
 
@@ -68,12 +87,12 @@ def my_events(request):
 @login_required
 @staff_member_required
 def edit_all_events(request):
-    all_events = Event.objects.all()
+    all_events = add_cards(Event.objects.with_next_date(), request.user)
     return render(request, 'main/home.html', {
         'page_title': 'All Events',
         'events': all_events,
         'titles': {
-            'All Events': all_events.count(),
+            'All Events': len(all_events),
         }
     })
 
@@ -81,7 +100,7 @@ def edit_all_events(request):
 def register(request):
     form = CreateMemberForm()
     if request.method == "POST":
-        form = CreateMemberForm(request.POST)
+        form = CreateMemberForm(request.POST, request.FILES)
         if form.is_valid():
             form.save()
             email = form.cleaned_data.get('email')
@@ -159,7 +178,7 @@ def edit_event(request, event_id):
         form.save()
         messages.success(request, f"You edited the event: {event.title}.")
         return redirect('home')
-    return render(request, 'main/edit_event.html', {'event': event, 'clinics': event.get_clinics(), 'form': form})
+    return render(request, 'main/edit_event.html', {'event': event, 'clinics': event.get_clinics().with_next_date(), 'form': form})
 
 
 @login_required
@@ -170,6 +189,7 @@ def edit_profile(request):
             request.POST, request.FILES, instance=request.user)
         if form.is_valid():
             form.save()
+            stick_to_primary(request)
             messages.success(request, f"You edited your profile.")
             return redirect('home')
     return render(request, 'main/edit_profile.html', {'form': form})
@@ -179,35 +199,30 @@ def edit_profile(request):
 @staff_member_required
 def edit_clinic(request, clinic_id):
     clinic = get_object_or_404(Clinic, id=clinic_id)
-    old_occurrences = list(clinic.recurrences.occurrences(dtend=date_limit))
+    # The occurrences before the edit, to tell which ones were removed or added
+    old_occurrences = clinic.get_occurrence_datetimes() if request.method == 'POST' else None
     form = CreateClinicForm(request.POST or None, instance=clinic)
     if form.is_valid():
-        new_occurrences = list(
-            form.instance.recurrences.occurrences(dtend=date_limit))
-        # If the time of the clinic it's changed, then all dates should be deleted
-        # and ask the members to sign up for the new dates.
-        if form.data['start_time'] != str(clinic.start_time) or \
-           form.data['end_time'] != str(clinic.end_time):
-            for date in clinic.get_fut_dates():
-                date.delete()
-            form.instance.update_date_instances()
-        # Instead, if only some dates were added or deleted,
-        # then just these would be manage without deleting all
-        # the future dates.
-        elif old_occurrences != new_occurrences:
-            form.instance.update_date_instances(old_occurrences)
-
-        elif form.data['capacity'] != clinic.capacity:
-            form.instance.update_dates_capacity()
-
         form.save()
-        messages.success(request, f"You edited the clinic: {clinic.title}.")
+        if not {'recurrences', 'start_time', 'end_time', 'capacity'} & set(form.changed_data):
+            messages.success(request, f"You edited the clinic: {clinic.title}.")
+            return redirect('home')
+        # Dates are created/deleted based on the recurrences and times of the clinic.
+        # If the start time of the clinic is changed, the future dates get replaced and
+        # the members have to sign up for the new dates. A new end time or capacity
+        # updates the dates in place, and their registrations are kept. The dates
+        # moved or deleted by the staff are left as they are.
+        changes = clinic.update_date_instances(
+            old_occurrences, sync_capacity='capacity' in form.changed_data)
+        messages.success(
+            request, f"You edited the clinic: {clinic.title}. "
+            f"Dates created: {changes['created']}, deleted: {changes['deleted']}, updated: {changes['updated']}.")
         return redirect('home')
 
     return render(request, 'main/edit_clinic.html',
                   {'event': clinic.get_event(),
                    'clinic': clinic,
-                   'dates': clinic.get_all_dates(),
+                   'dates': clinic.get_all_dates().select_related('clinic__event'),
                    'form': form})
 
 
@@ -229,18 +244,18 @@ def edit_date(request, date_id):
 
 
 @login_required
+@read_from_replica
 def event(request, event_id):
     event = Event.objects.get(id=event_id)
-    dates = event.get_fut_dates(20)
+    dates = event.get_date_details(request.user, 20)
     if dates:
-        user_dates = Date.objects.filter(
-            participation__member=request.user).filter(clinic__event=event)
-        return render(request, 'main/event.html', {'event': event, 'dates': dates, 'user_dates': user_dates})
+        return render(request, 'main/event.html', {'event': event, 'dates': dates})
     else:
         return redirect("home")
 
 
 @login_required()
+@read_from_replica
 def event_participants(request, event_id):
     event = Event.objects.get(id=event_id)
     on_courts = []
@@ -261,57 +276,109 @@ def add_participant(request):
     if request.method == 'POST':
         dates = request.POST.get('dates', None)
         event = Event.objects.get(id=request.POST.get('event_id', None))
-        dates = json.loads(dates)
-        # If the user selected some dates.
-        if dates:
-            # Check the event's gender and they user can sign up for it
-            if event.gender != 'MIXED' and event.gender != request.user.gender:
-                return HttpResponseBadRequest(f"You can't sign up for an event for {event.get_gender_display()}s.")
-
-            # Getting the dates the user already sign up for
-            old_reg_dates_ids = list(Date.objects.filter(participation__member=request.user).filter(
-                clinic__event=event).values_list('id', flat=True))
-            # Assuming that the current selection of dates is the newest one. Since 'dates' contains
-            # the dates the user already registered for and the new ones, if any.
-            new_reg_dates_ids = [int(id) for id in dates]
-
-            # The common subset of the old dates registered and the new ones
-            # is the one containing the dates to be deleted or created.
-            reg_dates = list(set(old_reg_dates_ids).symmetric_difference(
-                set(new_reg_dates_ids)))
-
-            for date_id in reg_dates:
-                selected_date = Date.objects.get(id=date_id)
-                try:
-                    # If the participation exists in the DB, then it gets deleted.
-                    Participation.objects.get(
-                        member=request.user, date=selected_date).delete()
-                except Participation.DoesNotExist:
-                    # Otherwise, it gets created.
-                    part = Participation.objects.create(
-                        member=request.user, date=selected_date)
-                    part.save()
+        # Assuming that the current selection of dates is the newest one. Since 'dates' contains
+        # the dates the user already registered for and the new ones, if any.
+        new_reg_dates_ids = [int(id) for id in json.loads(dates)]
+        try:
+            created, deleted = update_registrations(
+                request.user, event, new_reg_dates_ids)
+        except ValidationError as err:
+            return HttpResponseBadRequest(err.message)
+        # The member's next pages show the registrations they just made
+        stick_to_primary(request)
+
+        if new_reg_dates_ids:
             return JsonResponse({'message': "You have successfully registered for the selected dates."})
         # If the the user didn't select any dates it means that they either unregistered
         # from all dates or they just forgot to register for any.
+        elif deleted:
+            return JsonResponse({'message': "You have successfully unregistered for all the dates."})
+        # Otherwise, it prompts a message saying they didn't select any date.
         else:
-            old_reg_dates_ids = list(Date.objects.filter(participation__member=request.user).filter(
-                clinic__event=event).values_list('id', flat=True))
-            # If the user was already registered for some dates and now
-            # there are no selected dates. It means that he wants so sign out for all of them.
-            if old_reg_dates_ids:
-                # Then, it deletes all the user's participations for this event.
-                for date_id in old_reg_dates_ids:
-                    unselected_date = Date.objects.get(id=date_id)
-                    Participation.objects.get(
-                        member=request.user, date=unselected_date).delete()
-                return JsonResponse({'message': "You have successfully unregistered for all the dates."})
-            # Otherwise, it prompts a message saying they didn't select any date.
-            else:
-                return JsonResponse({'message': "You haven't selected any date."}, status=500)
+            return JsonResponse({'message': "You haven't selected any date."}, status=500)
     else:
         return HttpResponseBadRequest("Not a post")
 
 
+@login_required
 def calendar(request):
     return render(request, 'main/calendar.html')
+
+
+def parse_calendar_bound(value):
+    # Returns the aware datetime of a date or datetime parameter, or None
+    try:
+        value = parse_datetime(value or '')
+    except ValueError:
+        return None
+    if value and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def check_calendar_window(start, end):
+    # Returns the error of a window of the calendar feed, or None if it is valid
+    if not start or not end or end <= start:
+        return "start and end must be dates, with end after start"
+    if end - start > timedelta(days=CALENDAR_MAX_DAYS):
+        return f"The window can't be longer than {CALENDAR_MAX_DAYS} days"
+    return None
+
+
+@login_required
+@read_from_replica
+def calendar_feed(request):
+    # Returns the dates of the window between the start and end parameters
+    start = parse_calendar_bound(request.GET.get('start'))
+    end = parse_calendar_bound(request.GET.get('end'))
+    error = check_calendar_window(start, end)
+    if error:
+        return HttpResponseBadRequest(error)
+    return JsonResponse({'dates': get_calendar_dates(request.user, start, end)})
+
+
+@login_required
+@staff_member_required
+def metrics(request):
+    # Request metrics of all the workers in the Prometheus text format
+    return HttpResponse(render_prometheus(collect()), content_type='text/plain; version=0.0.4')
+
+
+def get_member_feed_updated(request, token):
+    member_id = get_feed_member_id(token)
+    return get_schedule_updated(member_id) if member_id else None
+
+
+def get_member_feed_etag(request, token):
+    updated = get_member_feed_updated(request, token)
+    return f'{token}-{updated.timestamp()}' if updated else None
+
+
+@condition(etag_func=get_member_feed_etag, last_modified_func=get_member_feed_updated)
+def member_feed(request, token):
+    # Calendar apps subscribe with the token, so there is no login
+    member_id = get_feed_member_id(token)
+    if member_id is None:
+        raise Http404
+    member = Member(id=member_id)
+    parts = member.get_feed_participations().iterator()
+    return StreamingHttpResponse(
+        iter_calendar('Tokeneke - My Events',
+                      ((part.date, part.date.clinic.event.title) for part in parts)),
+        content_type='text/calendar; charset=utf-8')
+
+
+def get_event_etag(request, event_id):
+    event = Event.objects.filter(id=event_id).first()
+    return get_event_feed_etag(event) if event else None
+
+
+@condition(etag_func=get_event_etag)
+def event_feed(request, event_id):
+    event = get_object_or_404(Event, id=event_id)
+    dates = event.get_feed_dates().iterator()
+    return StreamingHttpResponse(
+        iter_calendar(f'Tokeneke - {event.title}',
+                      ((date, f'{event.title} - {date.clinic.title}' if date.clinic.title else event.title)
+                       for date in dates)),
+        content_type='text/calendar; charset=utf-8')
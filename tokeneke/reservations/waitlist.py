@@ -0,0 +1,71 @@
+"""
+Promotion of the waitlists. The participants of a Date beyond its capacity
+are on its waitlist, in registration order, so deleting participations
+moves the first ones of the waitlist onto court. get_promotions() works out
+who moves with one query, run before the delete, and notify_promotions()
+queues a mail per promoted member in the outbox, in the same transaction.
+The Dates stay locked until the delete commits, so concurrent deletes on a
+Date see each other's and don't promote the same member twice.
+"""
+from django.core.mail import EmailMessage, get_connection
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count, F, Q, RowRange, Window
+from django.db.models.functions import RowNumber
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+PROMOTION_SUBJECT = "You're on court"
+
+
+def get_promotions(deleted_ids, date_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Returns a list of dicts with the member, date and event of the waitlisted
+    participations of the future dates of date_ids that end up on court once
+    the participations of deleted_ids are deleted. Those are the ones beyond
+    the capacity whose position, minus the deleted participations before
+    them, is within it. It must run in the transaction of the delete, since
+    it locks the Dates first.
+    """
+    from .models import Date, Participation
+
+    deleted_ids = list(deleted_ids)
+    if not deleted_ids:
+        return []
+    # Locked in id order, so deletes spanning several Dates don't deadlock
+    list(Date.objects.using(using).select_for_update().filter(id__in=date_ids).order_by('id').values_list('id'))
+    order = [F('date_registered').asc(), F('id').asc()]
+    ranked = Participation.objects.using(using).filter(
+        date_id__in=date_ids, date__datetime_start__gte=timezone.now()).annotate(
+        position=Window(RowNumber(), partition_by=F('date_id'), order_by=order),
+        deleted_before=Window(Count('id', filter=Q(id__in=deleted_ids)), partition_by=F('date_id'),
+                              order_by=order, frame=RowRange(start=None, end=0)),
+        capacity=F('date__capacity'),
+        email=F('member__email'),
+        first_name=F('member__first_name'),
+        datetime_start=F('date__datetime_start'),
+        title=F('date__clinic__event__title'),
+    ).values('id', 'member_id', 'date_id', 'position', 'deleted_before', 'capacity', 'email',
+             'first_name', 'datetime_start', 'title')
+    sql, params = ranked.query.sql_with_params()
+    # Django 4.1 can't filter on window functions, so the query is wrapped
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT member_id, date_id, email, first_name, datetime_start, title FROM ({sql}) ranked '
+            f'WHERE NOT id = ANY(%s) AND position > capacity AND position - deleted_before <= capacity '
+            f'ORDER BY member_id, datetime_start', (*params, deleted_ids))
+        columns = [column.name for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def notify_promotions(promotions):
+    # Queues one mail per promoted member, with all the dates they moved onto court for
+    dates_by_member = {}
+    for promotion in promotions:
+        dates_by_member.setdefault(promotion['member_id'], []).append(promotion)
+    messages = [EmailMessage(
+        PROMOTION_SUBJECT,
+        render_to_string('mail/promoted.txt', {'first_name': dates[0]['first_name'], 'dates': dates}),
+        to=[dates[0]['email']]) for dates in dates_by_member.values()]
+    if messages:
+        get_connection().send_messages(messages)
+    return len(messages)
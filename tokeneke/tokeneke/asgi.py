@@ -0,0 +1,18 @@
+"""
+ASGI config for tokeneke project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tokeneke.settings')
+# Routes the read views to their async versions
+os.environ.setdefault('SERVER_MODE', 'asgi')
+
+application = get_asgi_application()
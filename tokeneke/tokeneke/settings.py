@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'reservations',
     'crispy_forms',
     'recurrence'
@@ -45,6 +46,7 @@ CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'reservations.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -53,6 +55,28 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request metrics, see reservations/metrics.py. Each worker writes its
+# metrics to METRICS_DIR, which has to be shared by all the workers.
+METRICS_DIR = os.environ.get('METRICS_DIR', '/tmp/tokeneke-metrics')
+METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', 10))
+METRICS_SLOW_REQUEST_MS = int(os.environ.get('METRICS_SLOW_REQUEST_MS', 500))
+METRICS_SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get('METRICS_SLOW_REQUEST_SAMPLE_RATE', 0.1))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'reservations': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
 
 ROOT_URLCONF = 'tokeneke.urls'
 
@@ -76,6 +100,10 @@ TEMPLATES = [
 WSGI_APPLICATION = 'tokeneke.wsgi.application'
 
 
+# 'wsgi' under uWSGI or 'asgi' under Uvicorn, where urls.py uses the async
+# read views. asgi.py sets it.
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
@@ -86,9 +114,37 @@ DATABASES = {
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'PORT': os.environ.get('DB_PORT', ''),
+        # Every uWSGI worker keeps its connection between requests, checking
+        # that it still works before reusing it. 0 closes it after each request,
+        # the default under ASGI, where connections can't be shared between
+        # the requests a worker runs at once.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0 if SERVER_MODE == 'asgi' else 300)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
 
+# Behind a pooler in transaction mode, like PgBouncer, consecutive
+# transactions may run on different server connections. Cursors can't be
+# held between them, so iterator() fetches the rows with a client side
+# cursor. psycopg2 doesn't use prepared statements, so there is nothing to
+# disable for them.
+if os.environ.get('DB_POOLER_TRANSACTION_MODE') == '1':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Read replicas of the primary, see reservations/routers.py
+DB_REPLICA_HOSTS = [host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host]
+for i, host in enumerate(DB_REPLICA_HOSTS):
+    DATABASES[f'replica{i}'] = {**DATABASES['default'], 'HOST': host}
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['reservations.routers.ReplicaRouter']
+# Seconds a member reads from the primary after writing
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -125,6 +181,33 @@ USE_TZ = True
 
 AUTH_USER_MODEL = 'reservations.Member'
 
+# The logged in Member is loaded from the cache. ModelBackend stays listed
+# so the sessions created before CachedModelBackend keep working.
+AUTHENTICATION_BACKENDS = [
+    'reservations.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Shared cache, picked with CACHE_BACKEND: 'locmem' for development, 'file'
+# for the workers of a single host and 'redis' for several hosts. The file
+# backend can stand in for Redis locally.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', '/tmp/tokeneke-cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://localhost:6379/0'),
+}
+CACHE_BACKEND, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')]
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_DEFAULT_LOCATION),
+    }
+}
+
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.0/howto/static-files/
 
@@ -136,13 +219,25 @@ MEDIA_URL = '/static/media/'
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
+# Static files generated at build time, like the JavaScript catalog of
+# build_jsi18n, which collectstatic collects with the others
+GENERATED_STATIC_DIR = BASE_DIR / 'generated_static'
+STATICFILES_DIRS = [GENERATED_STATIC_DIR]
+
+# Hashed names and gzip and brotli copies, see reservations/storage.py
+STATICFILES_STORAGE = 'reservations.storage.CompressedManifestStaticFilesStorage'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Mail goes through the outbox, see reservations/mail.py, and the deliver_mail
+# command sends it with OUTBOX_EMAIL_BACKEND, which can be any email backend
+EMAIL_BACKEND = 'reservations.mail.OutboxEmailBackend'
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_TIMEOUT = 30
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
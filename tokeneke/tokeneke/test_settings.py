@@ -0,0 +1,19 @@
+"""
+Django settings for the tests of tokeneke, run with:
+
+    python manage.py test --settings=tokeneke.test_settings
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+# The tests read from the primary, except the router tests, which route
+# to replica0: a second connection to the test database.
+DATABASES = {
+    'default': DATABASES['default'],
+    'replica0': {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}},
+}
+REPLICA_DATABASES = []
+
+# The tests run without collectstatic, so without a manifest
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'